@@ -0,0 +1,108 @@
+"""SQLite под одновременные запросы: WAL, прагмы и BEGIN IMMEDIATE.
+
+Бэкенд подключается как ENGINE 'core.db' и отличается от встроенного
+sqlite3 тремя вещами:
+
+- каждое новое соединение получает прагмы DEFAULT_PRAGMAS, дополненные
+  и переопределённые OPTIONS['pragmas'] (None отключает прагму). В
+  режиме WAL читатели не ждут писателя, а busy_timeout заставляет
+  писателей ждать друг друга, а не падать с «database is locked»;
+- транзакции начинаются с BEGIN OPTIONS['transaction_mode'], по
+  умолчанию IMMEDIATE. Отложенная транзакция, которая сначала читает,
+  а потом пишет, не может дождаться блокировки записи и падает сразу,
+  не глядя на busy_timeout;
+- при CONN_HEALTH_CHECKS соединение, живущее между запросами
+  (CONN_MAX_AGE), проверяется перед первым использованием в запросе:
+  если файл базы подменили (восстановили из копии), оно открывается
+  заново.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base as sqlite3_base
+
+Database = sqlite3_base.Database
+
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    # В WAL с NORMAL сбой питания может потерять последние коммиты, но не
+    # испортить базу; fsync на каждый коммит не нужен.
+    'synchronous': 'normal',
+    # Отрицательное значение — размер в КиБ, то есть 64 МБ страниц.
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA для открытого соединения sqlite3."""
+    for name, value in pragmas.items():
+        if value is not None:
+            connection.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.transaction_mode = options.get(
+            'transaction_mode', 'IMMEDIATE'
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        self.health_check_done = False
+        self.database_file = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        self.database_file = self._database_file()
+        self.health_check_done = True
+        return connection
+
+    def _database_file(self):
+        """Устройство и inode файла базы: по ним видно подмену файла."""
+        if self.is_in_memory_db():
+            return None
+        try:
+            stat = os.stat(self.settings_dict['NAME'])
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return self._database_file() == self.database_file
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,107 @@
+import functools
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(budget):
+    """Объявляет, сколько SQL-запросов может сделать view.
+
+    Превышение пишется в лог предупреждением, а сам бюджет доступен
+    как view.query_budget, чтобы тесты проверяли его явно.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            queries = []
+
+            def counter(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            if len(queries) > budget:
+                logger.warning(
+                    'Query budget exceeded in %s: %d of %d queries',
+                    view.__qualname__, len(queries), budget,
+                    extra={'queries': queries, 'path': request.path},
+                )
+            return response
+        wrapper.query_budget = budget
+        return wrapper
+    return decorator
+
+
+def anonymous_cache_page(timeout, key_func=None):
+    """Кеширует страницу целиком, но только для анонимных GET-запросов.
+
+    Авторизованные пользователи всегда получают свежий ответ со своей
+    шапкой, поэтому персональные данные не попадают в общий кеш.
+    key_func(request, *args, **kwargs) добавляет к ключу версию данных,
+    чтобы изменения сбрасывали кеш раньше timeout.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            url = request.build_absolute_uri()
+            if key_func is not None:
+                url += '#' + key_func(request, *args, **kwargs)
+            key = 'anonymous_page:' + hashlib.md5(url.encode()).hexdigest()
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_page(etag_func, last_modified_func=None, shared_max_age=0):
+    """Отвечает 304 Not Modified, если у клиента актуальная страница.
+
+    etag_func(request, *args, **kwargs) возвращает версию данных
+    страницы, не обращаясь к шаблонам; к ней добавляется пользователь,
+    потому что шапка и формы у каждого свои, и его CSRF-токен: после
+    нового входа токен меняется, и форма из старой копии получила бы
+    403. Анонимные ответы помечаются
+    public, и обратный прокси может держать их shared_max_age секунд,
+    а авторизованные — private. Браузер в любом случае перепроверяет
+    страницу при каждом переходе.
+    """
+    def etag(request, *args, **kwargs):
+        viewer = ''
+        if request.user.is_authenticated:
+            viewer = f'{request.user.pk}:{request.META.get("CSRF_COOKIE", "")}'
+        version = f'{etag_func(request, *args, **kwargs)}#{viewer}'
+        return hashlib.md5(version.encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified_func)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=shared_max_age,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
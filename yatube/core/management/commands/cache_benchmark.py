@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    ('locmem', 'django.core.cache.backends.locmem.LocMemCache', ''),
+    ('filebased', 'django.core.cache.backends.filebased.FileBasedCache',
+     'filebased'),
+    ('sqlite', 'core.cache.SQLiteCache', 'cache.sqlite3'),
+)
+COUNTER_KEY = 'benchmark:counter'
+
+
+def run_worker(backend, location, max_entries, keys, operations, seed,
+               results):
+    """Чтение со сквозной записью случайных ключей и incr счётчика.
+
+    Экземпляр кеша создаётся уже в дочернем процессе, как у воркера
+    gunicorn или uwsgi.
+    """
+    cache = import_string(backend)(location, {
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    })
+    rand = random.Random(seed)
+    payload = 'x' * 512
+    hits = 0
+    started = time.perf_counter()
+    for number in range(operations):
+        key = f'benchmark:{rand.randrange(keys)}'
+        if cache.get(key) is None:
+            cache.set(key, payload, 300)
+        else:
+            hits += 1
+        if number % 10 == 0:
+            try:
+                cache.incr(COUNTER_KEY)
+            except ValueError:
+                cache.add(COUNTER_KEY, 0, None)
+                cache.incr(COUNTER_KEY)
+    results.put((hits, time.perf_counter() - started, cache.get(COUNTER_KEY)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и core.cache.SQLiteCache '
+        'при нескольких процессах: пропускную способность, долю попаданий '
+        'и потерянные инкременты общего счётчика.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000,
+                            help='Операций чтения на один процесс.')
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--max-entries', type=int, default=2000)
+        parser.add_argument('--backend', action='append',
+                            choices=[name for name, _, _ in BACKENDS],
+                            help='Какие бэкенды запускать, по умолчанию все.')
+
+    def handle(self, *args, **options):
+        selected = options['backend'] or [name for name, _, _ in BACKENDS]
+        processes = options['processes']
+        operations = options['operations']
+        increments = processes * len(range(0, operations, 10))
+        self.stdout.write(
+            f'{"backend":<10} {"ops/s":>10} {"hit rate":>9} {"counter":>15}'
+        )
+        for name, backend, location in BACKENDS:
+            if name not in selected:
+                continue
+            directory = tempfile.mkdtemp(prefix='yatube-cache-')
+            try:
+                hits, seconds, counters = self.run(
+                    backend, os.path.join(directory, location), options
+                )
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            total = processes * operations
+            self.stdout.write(
+                f'{name:<10} {total / seconds:>10.0f} '
+                f'{hits / total:>9.1%} {max(counters):>7}/{increments:<7}'
+            )
+
+    def run(self, backend, location, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_worker, args=(
+                backend, location, options['max_entries'], options['keys'],
+                options['operations'], seed, results,
+            ))
+            for seed in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        stats = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        hits = sum(hit for hit, _, _ in stats)
+        # Процессы работают параллельно: время прогона — время самого
+        # медленного из них.
+        seconds = max(elapsed for _, elapsed, _ in stats)
+        return hits, seconds, [counter or 0 for _, _, counter in stats]
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.db.base import DEFAULT_PRAGMAS, apply_pragmas
+
+# Как ведёт себя встроенный бэкенд sqlite3: журнал по умолчанию,
+# BEGIN DEFERRED и ожидание блокировки 5 секунд из модуля sqlite3.
+STOCK = ({}, 'DEFERRED')
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'pub_date REAL, text TEXT)',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date)',
+    'CREATE TABLE stats (author_id INTEGER PRIMARY KEY, posts INTEGER)',
+)
+AUTHORS: int = 100
+
+
+def run_worker(path, pragmas, mode, writer, seconds, seed, results):
+    """Читатель — страницы профиля, писатель — пост со счётчиком.
+
+    Писатель сначала читает, потом пишет, как post_create с сигналами.
+    """
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(connection, pragmas)
+    rand = random.Random(seed)
+    operations = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        author = rand.randrange(AUTHORS)
+        try:
+            if writer:
+                connection.execute(f'BEGIN {mode}')
+                try:
+                    connection.execute(
+                        'SELECT posts FROM stats WHERE author_id = ?',
+                        (author,),
+                    ).fetchone()
+                    connection.execute(
+                        'INSERT INTO post (author_id, pub_date, text) '
+                        'VALUES (?, ?, ?)', (author, time.time(), 'x' * 300),
+                    )
+                    connection.execute(
+                        'UPDATE stats SET posts = posts + 1 '
+                        'WHERE author_id = ?', (author,),
+                    )
+                    connection.execute('COMMIT')
+                except sqlite3.Error:
+                    connection.execute('ROLLBACK')
+                    raise
+            else:
+                connection.execute(
+                    'SELECT id, text FROM post WHERE author_id = ? '
+                    'ORDER BY pub_date DESC LIMIT 10', (author,),
+                ).fetchall()
+            operations += 1
+        except sqlite3.OperationalError:
+            # «database is locked»: запрос пользователя закончился 500.
+            errors += 1
+    connection.close()
+    results.put((writer, operations, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite со стандартными настройками Django и с '
+        'настройками core.db (WAL, прагмы, BEGIN IMMEDIATE) при '
+        'параллельных процессах-читателях и писателях: чтений и записей '
+        'в секунду и ошибок «database is locked».'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=20000,
+                            help='Постов в базе перед прогоном.')
+
+    def handle(self, *args, **options):
+        settings_dict = connections['default'].settings_dict
+        tuned = (
+            {
+                **DEFAULT_PRAGMAS,
+                **settings_dict['OPTIONS'].get('pragmas', {}),
+            },
+            settings_dict['OPTIONS'].get(
+                'transaction_mode', 'IMMEDIATE'
+            ).upper(),
+        )
+        self.stdout.write(
+            f'{"config":<8} {"reads/s":>10} {"writes/s":>10} '
+            f'{"read errors":>12} {"write errors":>13}'
+        )
+        for name, (pragmas, mode) in (('stock', STOCK), ('core.db', tuned)):
+            directory = tempfile.mkdtemp(prefix='yatube-db-')
+            try:
+                path = os.path.join(directory, 'db.sqlite3')
+                self.prepare(path, pragmas, options['rows'])
+                stats = self.run(path, pragmas, mode, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{name:<8} {stats[False][0] / seconds:>10.0f} '
+                f'{stats[True][0] / seconds:>10.0f} '
+                f'{stats[False][1]:>12} {stats[True][1]:>13}'
+            )
+
+    def prepare(self, path, pragmas, rows):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, pragmas)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        rand = random.Random(0)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)',
+            (
+                (rand.randrange(AUTHORS), rand.random(), 'x' * 300)
+                for _ in range(rows)
+            ),
+        )
+        connection.executemany(
+            'INSERT INTO stats VALUES (?, 0)',
+            ((author,) for author in range(AUTHORS)),
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, path, pragmas, mode, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        roles = [False] * options['readers'] + [True] * options['writers']
+        workers = [
+            context.Process(target=run_worker, args=(
+                path, pragmas, mode, writer, options['seconds'], seed,
+                results,
+            ))
+            for seed, writer in enumerate(roles)
+        ]
+        for worker in workers:
+            worker.start()
+        stats = {False: [0, 0], True: [0, 0]}
+        for _ in workers:
+            writer, operations, errors = results.get()
+            stats[writer][0] += operations
+            stats[writer][1] += errors
+        for worker in workers:
+            worker.join()
+        return stats
@@ -0,0 +1,242 @@
+import importlib
+import json
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+BENCHMARKED_URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+# Маршруты, которые меняют данные или состояние клиента даже на GET.
+SKIPPED_ROUTES = {
+    'users:logout',
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'posts:follow_many',
+    'posts:unfollow_many',
+}
+SAMPLE_SIZE: int = 200
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: параллельные клиенты обходят все маршруты '
+        'posts, users и about через полный стек middleware и считают '
+        'p50/p95/p99, запросы к БД на ответ и пропускную способность. '
+        'Клиенты — потоки одного процесса (django.test.Client), поэтому '
+        'цифры сравнимы между коммитами, а не с боевым сервером. '
+        'Запускать на данных generate_dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=4)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на каждый маршрут.',
+        )
+        parser.add_argument(
+            '--login', metavar='USERNAME',
+            help='Ходить авторизованным пользователем.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--compare', metavar='JSON',
+            help='Показать изменение p95 относительно прошлого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        self.rand = random.Random(options['seed'])
+        self.user = None
+        if options['login']:
+            user_model = apps.get_model('auth', 'User')
+            try:
+                self.user = user_model.objects.get(
+                    username=options['login']
+                )
+            except user_model.DoesNotExist:
+                raise CommandError(f'Нет пользователя {options["login"]}')
+        self.samples = self.load_samples()
+        tasks = [
+            (name, self.sample_url(name, pattern))
+            for name, pattern in self.routes()
+            for _ in range(options['requests'])
+        ]
+        self.rand.shuffle(tasks)
+        clients = options['clients']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            parts = executor.map(self.run_client, (
+                tasks[number::clients] for number in range(clients)
+            ))
+            measurements = [item for part in parts for item in part]
+        elapsed = time.perf_counter() - started
+        results = self.summarize(measurements, elapsed, options)
+        self.print_results(results)
+        if options['compare']:
+            self.print_comparison(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+    def load_samples(self):
+        post = apps.get_model('posts', 'Post')
+        group = apps.get_model('posts', 'Group')
+        samples = {
+            'post_id': list(post.objects.order_by('?').values_list(
+                'pk', flat=True
+            )[:SAMPLE_SIZE]),
+            'slug': list(group.objects.order_by('?').values_list(
+                'slug', flat=True
+            )[:SAMPLE_SIZE]),
+            'username': list(post.objects.order_by('?').values_list(
+                'author__username', flat=True
+            )[:SAMPLE_SIZE]),
+            'kind': ['posts'],
+        }
+        if not all(samples.values()):
+            raise CommandError(
+                'Нет данных для маршрутов: запустите generate_dataset.'
+            )
+        return samples
+
+    def routes(self):
+        for module in BENCHMARKED_URLCONFS:
+            urlconf = importlib.import_module(module)
+            for pattern in urlconf.urlpatterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                name = f'{urlconf.app_name}:{pattern.name}'
+                if name not in SKIPPED_ROUTES:
+                    yield name, pattern
+
+    def sample_url(self, name, pattern):
+        kwargs = {
+            parameter: self.rand.choice(self.samples[parameter])
+            for parameter in pattern.pattern.converters
+        }
+        return reverse(name, kwargs=kwargs)
+
+    def run_client(self, tasks):
+        """Один клиент: свой Client, своё соединение с БД в потоке."""
+        client = Client(HTTP_HOST='localhost')
+        if self.user is not None:
+            client.force_login(self.user)
+        measurements = []
+        try:
+            for name, url in tasks:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    try:
+                        response = client.get(url)
+                        if response.streaming:
+                            for _ in response.streaming_content:
+                                pass
+                        status = response.status_code
+                    except Exception:
+                        # Client пробрасывает исключения view, а не 500.
+                        status = 500
+                    seconds = time.perf_counter() - started
+                measurements.append((name, seconds, len(queries), status))
+        finally:
+            connection.close()
+        return measurements
+
+    def summarize(self, measurements, elapsed, options):
+        routes = {}
+        for name, seconds, queries, status in measurements:
+            route = routes.setdefault(
+                name, {'times': [], 'queries': [], 'statuses': {}}
+            )
+            route['times'].append(seconds * 1000)
+            route['queries'].append(queries)
+            route['statuses'][str(status)] = (
+                route['statuses'].get(str(status), 0) + 1
+            )
+        summary = {}
+        for name, route in sorted(routes.items()):
+            times = sorted(route['times'])
+            summary[name] = {
+                'requests': len(times),
+                **{
+                    f'p{percent}_ms': round(percentile(times, percent), 2)
+                    for percent in PERCENTILES
+                },
+                'queries': round(
+                    sum(route['queries']) / len(route['queries']), 2
+                ),
+                'statuses': route['statuses'],
+            }
+        return {
+            'commit': current_commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'clients': options['clients'],
+            'login': options['login'],
+            'requests': len(measurements),
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(measurements) / elapsed, 1),
+            'routes': summary,
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"route":<28} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"queries":>8}  statuses'
+        )
+        for name, route in results['routes'].items():
+            statuses = ' '.join(
+                f'{status}x{count}'
+                for status, count in sorted(route['statuses'].items())
+            )
+            self.stdout.write(
+                f'{name:<28} {route["p50_ms"]:>8.1f} {route["p95_ms"]:>8.1f} '
+                f'{route["p99_ms"]:>8.1f} {route["queries"]:>8.1f}  '
+                f'{statuses}'
+            )
+        self.stdout.write(
+            f'{results["requests"]} запросов за {results["seconds"]} с, '
+            f'{results["throughput_rps"]} запросов/с'
+        )
+
+    def print_comparison(self, results, path):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(
+            f'p95 относительно {previous.get("commit") or path}:'
+        )
+        for name, route in results['routes'].items():
+            before = previous['routes'].get(name)
+            if not before or not before['p95_ms']:
+                continue
+            change = (route['p95_ms'] / before['p95_ms'] - 1) * 100
+            self.stdout.write(
+                f'{name:<28} {before["p95_ms"]:>8.1f} -> '
+                f'{route["p95_ms"]:>8.1f} ms ({change:+.0f}%)'
+            )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import QueryStat
+from core.slow_queries import SLOW_QUERY_REPEAT_THRESHOLD
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'count': '-slow_count',
+    'repeats': '-max_repeats',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает самые тяжёлые SQL-запросы, записанные '
+        'SlowQueryMiddleware: медленные и повторяющиеся за один '
+        'HTTP-запрос (N+1).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order-by', choices=ORDERINGS, default='total',
+            help='total — суммарное время медленных выполнений, max — '
+                 'самое долгое, count — их число, repeats — повторы.',
+        )
+        parser.add_argument('--view', help='Только запросы этого view.')
+        parser.add_argument(
+            '--plans', action='store_true', help='Печатать планы запросов.'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить собранную статистику.',
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = QueryStat.objects.all().delete()
+            self.stdout.write(f'Удалено записей: {deleted}')
+            return
+        repeat_threshold = getattr(
+            settings, 'SLOW_QUERY_REPEAT_THRESHOLD',
+            SLOW_QUERY_REPEAT_THRESHOLD,
+        )
+        stats = QueryStat.objects.order_by(
+            ORDERINGS[options['order_by']], '-last_seen'
+        )
+        if options['view']:
+            stats = stats.filter(view=options['view'])
+        stats = list(stats[:options['limit']])
+        if not stats:
+            self.stdout.write('Записей нет.')
+            return
+        self.stdout.write(
+            f'{"view":<28} {"slow":>6} {"total_ms":>10} {"max_ms":>8} '
+            f'{"repeats":>8}  sql'
+        )
+        for stat in stats:
+            flag = 'N+1 ' if stat.max_repeats >= repeat_threshold else ''
+            self.stdout.write(
+                f'{stat.view or "-":<28} {stat.slow_count:>6} '
+                f'{stat.total_ms:>10.1f} {stat.max_ms:>8.1f} '
+                f'{stat.max_repeats:>8}  {flag}{stat.sql[:120]}'
+            )
+            if options['plans'] and stat.plan:
+                for line in stat.plan.splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, verbose_name='Отпечаток')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='View')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('example', models.TextField(verbose_name='Пример запроса')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры примера')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('slow_count', models.PositiveIntegerField(default=0, verbose_name='Медленных выполнений')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Время медленных выполнений, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Самое долгое выполнение, мс')),
+                ('repeated_requests', models.PositiveIntegerField(default=0, verbose_name='HTTP-запросов с повторами')),
+                ('max_repeats', models.PositiveIntegerField(default=0, verbose_name='Больше всего выполнений за HTTP-запрос')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Статистика SQL-запроса',
+                'verbose_name_plural': 'Статистика SQL-запросов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='querystat',
+            constraint=models.UniqueConstraint(fields=('fingerprint', 'view'), name='unique query stat'),
+        ),
+    ]
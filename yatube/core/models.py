@@ -0,0 +1,39 @@
+from django.db import models
+
+
+class QueryStat(models.Model):
+    """Сводка по одному виду SQL-запроса в одном view.
+
+    Строки пишет core.slow_queries: медленные выполнения и запросы,
+    повторённые за один HTTP-запрос много раз (признак N+1).
+    """
+    fingerprint = models.CharField('Отпечаток', max_length=32)
+    view = models.CharField('View', max_length=200, blank=True)
+    sql = models.TextField('Нормализованный SQL')
+    example = models.TextField('Пример запроса')
+    params = models.TextField('Параметры примера', blank=True)
+    plan = models.TextField('План запроса', blank=True)
+    slow_count = models.PositiveIntegerField(
+        'Медленных выполнений', default=0
+    )
+    total_ms = models.FloatField('Время медленных выполнений, мс', default=0)
+    max_ms = models.FloatField('Самое долгое выполнение, мс', default=0)
+    repeated_requests = models.PositiveIntegerField(
+        'HTTP-запросов с повторами', default=0
+    )
+    max_repeats = models.PositiveIntegerField(
+        'Больше всего выполнений за HTTP-запрос', default=0
+    )
+    last_seen = models.DateTimeField('Последний раз', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Статистика SQL-запроса'
+        verbose_name_plural = 'Статистика SQL-запросов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint', 'view'], name='unique query stat'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.view}: {self.sql[:60]}'
@@ -0,0 +1,199 @@
+"""Запись медленных и повторяющихся SQL-запросов.
+
+SlowQueryMiddleware засекает каждый запрос к базе во время обработки
+HTTP-запроса. После ответа запросы сводятся по отпечатку —
+нормализованному SQL без литералов и с любыми списками IN (...) — и в
+QueryStat попадают:
+
+- запросы дольше SLOW_QUERY_THRESHOLD_MS вместе с EXPLAIN QUERY PLAN;
+- отпечатки, выполненные за один HTTP-запрос хотя бы
+  SLOW_QUERY_REPEAT_THRESHOLD раз: так выглядит N+1.
+
+Замеряется доля SLOW_QUERY_SAMPLE_RATE HTTP-запросов, чтобы страница с
+N+1 не писала в базу на каждом просмотре. Сводка, EXPLAIN и запись в
+QueryStat выполняются по сигналу request_finished, то есть когда ответ
+уже отдан клиенту и закрыт; ошибка базы при записи только логируется.
+Отчёт — команда slow_queries.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, FloatField, IntegerField, Value
+from django.db.models.functions import Greatest
+
+from .models import QueryStat
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS: float = 100
+SLOW_QUERY_REPEAT_THRESHOLD: int = 10
+SLOW_QUERY_SAMPLE_RATE: float = 0.1
+PARAMS_LENGTH: int = 1000
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def fingerprint(sql):
+    """(отпечаток, нормализованный SQL): параметры и литералы — «?»,
+    списки IN любой длины — «(...)»."""
+    normalized = _SPACES.sub(
+        ' ', _LISTS.sub('(...)', _LITERALS.sub('?', sql))
+    ).strip()
+    return hashlib.md5(normalized.encode()).hexdigest(), normalized
+
+
+def explain(alias, sql, params):
+    """План запроса SELECT или пустая строка."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor != 'sqlite':
+                cursor.execute('EXPLAIN ' + sql, params)
+                return '\n'.join(str(row[0]) for row in cursor.fetchall())
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return ''
+    # Строки плана SQLite: (id, parent, -, detail); вложенность — отступом.
+    depths = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depths[node] = depths.get(parent, -1) + 1
+        lines.append('  ' * depths[node] + detail)
+    return '\n'.join(lines)
+
+
+def record(view, queries, threshold_ms, repeat_threshold):
+    """Сводит запросы одного HTTP-запроса и обновляет QueryStat.
+
+    queries — кортежи (alias, sql, params, many, миллисекунды).
+    """
+    groups = {}
+    for alias, sql, params, many, duration in queries:
+        key, normalized = fingerprint(sql)
+        group = groups.setdefault(key, {
+            'sql': normalized, 'calls': 0, 'slow': [],
+            'example': (alias, sql, params, many),
+        })
+        group['calls'] += 1
+        if threshold_ms is not None and duration >= threshold_ms:
+            # Примером служит самое долгое выполнение.
+            if not group['slow'] or duration > max(group['slow']):
+                group['example'] = (alias, sql, params, many)
+            group['slow'].append(duration)
+    for key, group in groups.items():
+        repeated = group['calls'] >= repeat_threshold
+        if not group['slow'] and not repeated:
+            continue
+        alias, sql, params, many = group['example']
+        plan = ''
+        if group['slow'] and not many:
+            plan = explain(alias, sql, params)
+        _save(view, key, group, repeated, sql, params, plan)
+
+
+def _save(view, key, group, repeated, sql, params, plan):
+    slow = group['slow']
+    values = {
+        'slow_count': F('slow_count') + len(slow),
+        'total_ms': F('total_ms') + sum(slow),
+        'max_ms': Greatest(
+            'max_ms', Value(max(slow, default=0)), output_field=FloatField()
+        ),
+        'repeated_requests': F('repeated_requests') + int(repeated),
+        'max_repeats': Greatest(
+            'max_repeats', Value(group['calls']),
+            output_field=IntegerField(),
+        ),
+    }
+    if slow:
+        values.update(example=sql, params=repr(params)[:PARAMS_LENGTH])
+    if plan:
+        values['plan'] = plan
+    with transaction.atomic():
+        stat, _ = QueryStat.objects.get_or_create(
+            fingerprint=key, view=view,
+            defaults={
+                'sql': group['sql'], 'example': sql,
+                'params': repr(params)[:PARAMS_LENGTH],
+            },
+        )
+        QueryStat.objects.filter(pk=stat.pk).update(**values)
+
+
+def record_finished(**kwargs):
+    """Записывает запросы ответа, который только что закрыт."""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        _local.pending = None
+        try:
+            record(*pending)
+        except DatabaseError:
+            logger.exception(
+                'Не удалось записать запросы view %s', pending[0]
+            )
+
+
+request_finished.connect(record_finished)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SlowQueryMiddleware:
+    """Засекает SQL-запросы view и пишет медленные и повторы в QueryStat.
+
+    SLOW_QUERY_THRESHOLD_MS = None отключает учёт медленных запросов,
+    но не поиск повторов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.pending = None
+        rate = _setting('SLOW_QUERY_SAMPLE_RATE', SLOW_QUERY_SAMPLE_RATE)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+        queries = []
+
+        def timer(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((
+                    context['connection'].alias, sql, params, many,
+                    (time.perf_counter() - started) * 1000,
+                ))
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        if queries:
+            match = request.resolver_match
+            _local.pending = (
+                match.view_name if match is not None else '',
+                queries,
+                _setting('SLOW_QUERY_THRESHOLD_MS', SLOW_QUERY_THRESHOLD_MS),
+                _setting(
+                    'SLOW_QUERY_REPEAT_THRESHOLD', SLOW_QUERY_REPEAT_THRESHOLD
+                ),
+            )
+        return response
@@ -0,0 +1,57 @@
+"""Хранилище файлов с именами по содержимому.
+
+Имя файла — SHA-256 его содержимого в каталоге из upload_to:
+posts/3f/3fa1…c9.jpg. Одинаковые загрузки сохраняются один раз и
+получают одно имя, поэтому посты с одной картинкой делят и файл, и
+миниатюры sorl (их ключ строится от имени исходника). Файл под таким
+именем никогда не меняется, и его можно отдавать с
+Cache-Control: immutable.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE: int = 64 * 1024
+IMMUTABLE_MAX_AGE: int = 60 * 60 * 24 * 365
+# Имена, содержимое которых не меняется: исходники этого хранилища,
+# их варианты и миниатюры sorl, чьё имя — хеш имени исходника.
+IMMUTABLE_NAME = re.compile(
+    r'(posts/[0-9a-f]{2}/[0-9a-f]{64}'
+    r'|posts/variants/[0-9a-f]{40}-\d+'
+    r'|cache/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}(@\d+x)?)\.\w+'
+)
+
+
+def is_immutable(name):
+    return IMMUTABLE_NAME.fullmatch(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        saved = super().save(name, content, max_length=max_length)
+        if saved != name:
+            # Тот же файл параллельно записал другой запрос,
+            # а FileSystemStorage сохранил копию под другим именем.
+            self.delete(saved)
+        return name
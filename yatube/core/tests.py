@@ -1,6 +1,34 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
 from django.urls import reverse
 
+from core.cache import SQLiteCache
+from core.db.base import DatabaseWrapper
+from core.management.commands.load_benchmark import percentile
+from core.models import QueryStat
+from core.slow_queries import SlowQueryMiddleware, fingerprint
+from core.storage import ContentAddressedStorage
+from core.timing import RequestTiming, _local, measure
+from core.views import serve_media
+
+User = get_user_model()
+
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
@@ -15,3 +43,365 @@ class ViewTestClass(TestCase):
         """статус ответа сервера - 404."""
         response = self.client.get('core/404/')
         self.assertEqual(response.status_code, 404)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+        self.now = 1000.0
+        patcher = mock.patch('core.cache.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_entries_are_shared_between_instances(self):
+        """Запись одного экземпляра видна другому через общий файл."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.make_cache().get('key'), {'value': [1, 2]})
+        self.assertEqual(
+            self.make_cache().get_many(['key', 'missing']),
+            {'key': {'value': [1, 2]}},
+        )
+
+    def test_add_does_not_overwrite_live_entry(self):
+        """add срабатывает только для отсутствующего или истёкшего ключа."""
+        self.assertTrue(self.cache.add('lock', 'first', 10))
+        self.assertFalse(self.make_cache().add('lock', 'second', 10))
+        self.assertEqual(self.cache.get('lock'), 'first')
+        self.now += 11
+        self.assertIsNone(self.cache.get('lock'))
+        self.assertTrue(self.make_cache().add('lock', 'second', 10))
+        self.assertEqual(self.cache.get('lock'), 'second')
+
+    def test_incr(self):
+        """incr увеличивает число и не создаёт отсутствующий ключ."""
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+        self.cache.set('counter', 1, None)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+
+    def test_incr_is_atomic_between_processes(self):
+        """Инкременты нескольких процессов не теряются."""
+        self.cache.set('counter', 0, None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_cull_evicts_least_recently_used(self):
+        """При переполнении удаляются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3, CULL_EVERY=1)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            self.now += 10
+        cache.get('a')
+        self.now += 10
+        cache.set('d', 'd')
+        self.assertEqual(
+            set(cache.get_many(['a', 'b', 'c', 'd'])), {'a', 'c', 'd'}
+        )
+
+    def test_cull_removes_expired_entries_first(self):
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_EVERY=1)
+        cache.set('old', 1, 5)
+        cache.set('fresh', 2)
+        self.now += 10
+        cache.set('new', 3)
+        self.assertEqual(
+            cache.get_many(['old', 'fresh', 'new']), {'fresh': 2, 'new': 3}
+        )
+
+    def test_get_many_counts_as_access(self):
+        """Ключи, которые читаются только через get_many, тоже считаются
+        недавно использованными."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3, CULL_EVERY=1)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            self.now += 10
+        cache.get_many(['a'])
+        self.now += 10
+        cache.set('d', 'd')
+        self.assertEqual(
+            set(cache.get_many(['a', 'b', 'c', 'd'])), {'a', 'c', 'd'}
+        )
+
+    def test_size_checked_every_cull_every_writes(self):
+        """Размер проверяется раз в CULL_EVERY записей."""
+        cache = self.make_cache(MAX_ENTRIES=1, CULL_EVERY=3)
+        for key in ('a', 'b'):
+            cache.set(key, key)
+            self.now += 10
+        self.assertEqual(set(cache.get_many(['a', 'b'])), {'a', 'b'})
+        cache.set('c', 'c')
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c'])), {'c'})
+
+    def test_touch_and_delete(self):
+        self.cache.set('key', 'value', 5)
+        self.assertTrue(self.cache.touch('key', 60))
+        self.now += 30
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertFalse(self.cache.touch('key'))
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = ContentAddressedStorage(location=self.root)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('posts/a.JPG', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertRegex(first, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.root, os.path.dirname(first)))),
+            1,
+        )
+
+    def test_content_addressed_media_is_immutable(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'image'))
+        with open(os.path.join(self.root, 'posts', 'legacy.jpg'), 'wb') as f:
+            f.write(b'legacy')
+        factory = RequestFactory()
+        with override_settings(MEDIA_ROOT=self.root):
+            hashed = serve_media(factory.get('/'), name)
+            legacy = serve_media(factory.get('/'), 'posts/legacy.jpg')
+        self.assertIn('immutable', hashed['Cache-Control'])
+        self.assertIn('max-age=31536000', hashed['Cache-Control'])
+        self.assertFalse(legacy.has_header('Cache-Control'))
+
+
+class LoadBenchmarkTests(TransactionTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_benchmark_covers_routes(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        output = os.path.join(root, 'result.json')
+        with override_settings(MEDIA_ROOT=root):
+            call_command(
+                'generate_dataset', users=10, groups=2, posts=30,
+                comments=20, follows=10, image_share=0, stdout=StringIO(),
+            )
+            call_command(
+                'load_benchmark', clients=2, requests=2, output=output,
+                stdout=StringIO(),
+            )
+        with open(output, encoding='utf-8') as result:
+            routes = json.load(result)['routes']
+        self.assertIn('posts:index', routes)
+        self.assertIn('about:tech', routes)
+        self.assertNotIn('users:logout', routes)
+        self.assertEqual(routes['posts:index']['statuses'], {'200': 2})
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_header_reports_queries_cache_and_templates(self):
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(header, r'cache;dur=[\d.]+;desc="\d+ hits, \d+ ')
+        self.assertRegex(header, r'template;dur=[\d.]+')
+        self.assertRegex(header, r'total;dur=[\d.]+$')
+        record = logs.records[0]
+        self.assertEqual(record.view, 'posts:index')
+        self.assertGreater(record.timing['queries'], 0)
+        self.assertGreater(record.timing['cache_misses'], 0)
+
+    def test_cached_page_is_not_rendered_again(self):
+        self.client.get(reverse('posts:index'))
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        timing = logs.records[0].timing
+        self.assertNotIn('template_ms', timing)
+        self.assertGreater(timing['cache_hits'], 0)
+
+    def test_nested_measurements_are_counted_once(self):
+        timing = RequestTiming()
+        _local.timing = timing
+        self.addCleanup(setattr, _local, 'timing', None)
+        with measure('template'):
+            with measure('template'):
+                pass
+        self.assertEqual(list(timing.durations), ['template'])
+        with mock.patch('core.timing.time.perf_counter', side_effect=[0, 2]):
+            with measure('template'):
+                pass
+        self.assertGreaterEqual(timing.durations['template'], 2)
+
+    def test_header_is_hidden_from_visitors(self):
+        with self.assertLogs('core.timing', 'INFO'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_requests_outside_sample_are_not_measured(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(SLOW_QUERY_SAMPLE_RATE=1)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_fingerprint_ignores_literals_and_list_sizes(self):
+        first = fingerprint(
+            "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a' LIMIT 20"
+        )
+        second = fingerprint(
+            "SELECT  * FROM t WHERE id IN (%s)\n AND name = 'b''c' LIMIT 5"
+        )
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first[1], 'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_recorded_with_plan_and_view(self):
+        self.client.get(reverse('posts:index'))
+        stats = QueryStat.objects.filter(view='posts:index')
+        self.assertTrue(stats.exists())
+        self.assertTrue(all(stat.slow_count >= 1 for stat in stats))
+        self.assertTrue(stats.exclude(plan='').exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            for number in range(3):
+                list(QueryStat.objects.filter(pk=number + 1))
+            return HttpResponse()
+
+        middleware = SlowQueryMiddleware(view)
+        with override_settings(SLOW_QUERY_REPEAT_THRESHOLD=3):
+            response = middleware(self.factory.get('/'))
+            # Запись идёт, когда ответ уже отдан и закрыт.
+            self.assertFalse(QueryStat.objects.exists())
+            response.close()
+            middleware(self.factory.get('/')).close()
+        stat = QueryStat.objects.get()
+        self.assertEqual(stat.repeated_requests, 2)
+        self.assertEqual(stat.max_repeats, 3)
+        self.assertEqual(stat.slow_count, 0)
+        with override_settings(SLOW_QUERY_REPEAT_THRESHOLD=3):
+            output = StringIO()
+            call_command('slow_queries', stdout=output)
+        self.assertIn('N+1', output.getvalue())
+        call_command('slow_queries', reset=True, stdout=StringIO())
+        self.assertFalse(QueryStat.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_database_errors_are_logged_not_raised(self):
+        with mock.patch(
+            'core.slow_queries._save', side_effect=DatabaseError('locked')
+        ):
+            with self.assertLogs('core.slow_queries', 'ERROR'):
+                response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_fast_single_queries_are_not_recorded(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(QueryStat.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=0)
+    def test_requests_outside_sample_are_not_recorded(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(QueryStat.objects.exists())
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'db.sqlite3')
+
+    def wrapper(self, **options):
+        wrapper = DatabaseWrapper({
+            'ENGINE': 'core.db', 'NAME': self.path, 'OPTIONS': options,
+            'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+            'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+            'TIME_ZONE': None, 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'TEST': {},
+        }, alias='backend_test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_are_applied_and_configurable(self):
+        wrapper = self.wrapper(
+            pragmas={'cache_size': -1000, 'mmap_size': None}
+        )
+        wrapper.ensure_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -1000)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'), 0)
+
+    def test_transactions_take_write_lock_at_begin(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            other.execute('BEGIN IMMEDIATE')
+        wrapper.connection.execute('ROLLBACK')
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper(transaction_mode='LAZY')
+
+    def test_health_check_reopens_replaced_database(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        connection = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, connection)
+        replacement = self.path + '.restored'
+        sqlite3.connect(replacement).close()
+        os.replace(replacement, self.path)
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, connection)
@@ -0,0 +1,209 @@
+"""Замеры обработки запроса для заголовка Server-Timing.
+
+ServerTimingMiddleware считает для каждого запроса из выборки SQL-запросы
+и их время, обращения к кешу с попаданиями и промахами, время рендера
+шаблонов и общее время. Итог уходит в строку лога core.timing с теми же
+числами в record.timing, а сотрудникам (при DEBUG — всем) ещё и в
+заголовок Server-Timing, который показывают инструменты разработчика
+браузера: посторонним внутренние тайминги не отдаются.
+
+Доля замеряемых запросов задаётся SERVER_TIMING_SAMPLE_RATE (от 0 до 1,
+по умолчанию 1 %): запросы вне выборки проходят без обёрток, поэтому
+middleware можно держать включённым в бою. Другой код добавляет свои
+отрезки через measure('имя').
+"""
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_SAMPLE_RATE: float = 0.01
+# Методы кеша, время которых попадает в отрезок cache.
+CACHE_METHODS = (
+    'add', 'get', 'set', 'touch', 'delete', 'get_many', 'has_key', 'incr',
+    'set_many', 'delete_many',
+)
+
+_local = threading.local()
+
+
+class RequestTiming:
+    """Накопленные замеры одного запроса; длительности в секундах."""
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.running = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+
+    def as_dict(self):
+        result = {
+            f'{name}_ms': round(seconds * 1000, 2)
+            for name, seconds in self.durations.items()
+        }
+        result.update(
+            queries=self.queries,
+            cache_hits=self.cache_hits,
+            cache_misses=self.cache_misses,
+        )
+        return result
+
+    def header(self):
+        descriptions = {
+            'db': f'{self.queries} queries',
+            'cache': f'{self.cache_hits} hits, {self.cache_misses} misses',
+        }
+        metrics = []
+        for name, seconds in self.durations.items():
+            metric = f'{name};dur={seconds * 1000:.1f}'
+            if name in descriptions:
+                metric += f';desc="{descriptions[name]}"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+def current():
+    """Замеры запроса, который обрабатывает этот поток, или None."""
+    return getattr(_local, 'timing', None)
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к отрезку name текущего запроса.
+
+    Вложенные замеры с тем же именем не считаются второй раз.
+    """
+    timing = current()
+    if timing is None or name in timing.running:
+        yield
+        return
+    timing.running.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.running.discard(name)
+        timing.add(name, time.perf_counter() - started)
+
+
+def _count_query(execute, sql, params, many, context):
+    timing = current()
+    if timing is None:
+        return execute(sql, params, many, context)
+    timing.queries += 1
+    with measure('db'):
+        return execute(sql, params, many, context)
+
+
+def _timed_cache_method(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        timing = current()
+        if timing is None or 'cache' in timing.running:
+            return method(self, *args, **kwargs)
+        if method.__name__ == 'get_many':
+            keys = list(kwargs.pop('keys') if 'keys' in kwargs else args[0])
+            args = (keys,) + args[1:]
+        with measure('cache'):
+            result = method(self, *args, **kwargs)
+        if method.__name__ == 'get':
+            default = kwargs.get('default', args[1] if len(args) > 1 else None)
+            if result is default:
+                timing.cache_misses += 1
+            else:
+                timing.cache_hits += 1
+        elif method.__name__ == 'get_many':
+            timing.cache_hits += len(result)
+            timing.cache_misses += len(set(keys)) - len(result)
+        return result
+    return wrapper
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(*args, **kwargs):
+        with measure('template'):
+            return render(*args, **kwargs)
+    return wrapper
+
+
+def install():
+    """Оборачивает методы бэкендов кеша и рендер шаблонов Django.
+
+    Обёртки ставятся на классы один раз на процесс и ничего не делают,
+    пока поток не обрабатывает запрос из выборки.
+    """
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if backend.__dict__.get('_server_timing'):
+            continue
+        for name in CACHE_METHODS:
+            setattr(backend, name, _timed_cache_method(getattr(backend, name)))
+        backend._server_timing = True
+    if not Template.__dict__.get('_server_timing'):
+        Template.render = _timed_render(Template.render)
+        Template._server_timing = True
+
+
+def _shows_timing(request):
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class ServerTimingMiddleware:
+    """Замеряет запросы из выборки и пишет их в лог; сотрудникам
+    добавляет заголовок Server-Timing.
+
+    Стоит первым в MIDDLEWARE, чтобы total покрывал остальные
+    middleware и view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        rate = getattr(
+            settings, 'SERVER_TIMING_SAMPLE_RATE', SERVER_TIMING_SAMPLE_RATE
+        )
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+        timing = _local.timing = RequestTiming()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_count_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.timing = None
+        timing.add('total', time.perf_counter() - started)
+        if _shows_timing(request):
+            response['Server-Timing'] = timing.header()
+        match = request.resolver_match
+        view = match.view_name if match is not None else None
+        values = timing.as_dict()
+        logger.info(
+            '%s %s %d view=%s %s', request.method, request.path,
+            response.status_code, view,
+            ' '.join(f'{key}={value}' for key, value in values.items()),
+            extra={'timing': values, 'path': request.path, 'view': view},
+        )
+        return response
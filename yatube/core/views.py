@@ -1,6 +1,11 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .storage import IMMUTABLE_MAX_AGE, is_immutable
 
 
 def page_not_found(request, exception):
@@ -25,3 +30,18 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def serve_media(request, path):
+    """Раздаёт MEDIA_ROOT при DEBUG; файлы с именем по содержимому
+    кешируются браузером навсегда.
+
+    В продакшене те же заголовки должен ставить веб-сервер для имён,
+    подходящих под core.storage.IMMUTABLE_NAME.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_immutable(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    return response
@@ -1,6 +1,27 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import transaction
+from django.db.models import Count
+from django.template.response import TemplateResponse
 
-from .models import Comment, Group, Post
+from . import search
+from .caching import bump_generations
+from .models import Comment, Group, Post, change_counters
+from .utils import CachedCountPaginator
+
+
+class MoveToGroupForm(forms.Form):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        help_text='Пустое значение убирает посты из групп.',
+        widget=AutocompleteSelect(
+            Post._meta.get_field('group').remote_field, admin.site
+        ),
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,10 +34,110 @@ class PostAdmin(admin.ModelAdmin):
     )
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    list_editable = ('group',)
     empty_value_display = '-пусто-'
+    # Настройки для таблицы с миллионами постов: автор и группа
+    # приходят JOIN-ом, вместо выпадающих списков — поиск через
+    # autocomplete, количество строк оценивается. Группу меняют
+    # действием move_to_group, а не list_editable: autocomplete в
+    # каждой строке искал бы свою группу отдельным запросом. Вместо
+    # date_hierarchy, которому нужен DISTINCT по датам всей таблицы, —
+    # фильтр pub_date с фиксированными диапазонами.
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    actions = ('move_to_group',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через индекс FTS5, а не LIKE '%…%' по
+        # всей таблице.
+        if not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not search.match_query(search_term):
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(search_term)), False
+
+    def move_to_group(self, request, queryset):
+        """Переносит выбранные посты в группу одним UPDATE.
+
+        Сигналы при этом не срабатывают, поэтому счётчики групп и
+        поколения лент обновляются здесь же.
+        """
+        form = MoveToGroupForm(request.POST if 'apply' in request.POST
+                               else None)
+        if not form.is_valid():
+            context = {
+                **self.admin_site.each_context(request),
+                'title': 'Перенос постов в группу',
+                'opts': self.model._meta,
+                'form': form,
+                'media': self.media + form.media,
+                'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            }
+            return TemplateResponse(
+                request, 'admin/posts/post/move_to_group.html', context
+            )
+        group = form.cleaned_data['group']
+        queryset = queryset.order_by()
+        if group is None:
+            queryset = queryset.filter(group__isnull=False)
+        else:
+            queryset = queryset.exclude(group=group)
+        with transaction.atomic():
+            old_groups = list(
+                queryset.values_list('group_id').annotate(moved=Count('pk'))
+            )
+            usernames = list(
+                queryset.values_list('author__username', flat=True).distinct()
+            )
+            moved = queryset.update(group=group)
+            for group_id, count in old_groups:
+                if group_id is not None:
+                    change_counters(
+                        Group.objects.filter(pk=group_id),
+                        {'posts_count': -count},
+                    )
+            if group is not None:
+                change_counters(
+                    Group.objects.filter(pk=group.pk), {'posts_count': moved}
+                )
+        slugs = Group.objects.filter(
+            pk__in=[group_id for group_id, _ in old_groups]
+            + ([group.pk] if group else [])
+        ).values_list('slug', flat=True)
+        # Поколение index входит и в ключи страниц постов.
+        bump_generations(
+            'index',
+            *(f'group:{slug}' for slug in slugs),
+            *(f'profile:{username}' for username in usernames),
+        )
+        self.message_user(
+            request,
+            f'Перенесено постов: {moved}.',
+            messages.SUCCESS,
+        )
+        return None
+
+    move_to_group.short_description = 'Перенести в группу'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
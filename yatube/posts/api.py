@@ -0,0 +1,155 @@
+"""JSON только для чтения: ленты и посты для мобильного клиента.
+
+Ленты берут те же querysets и пагинацию, что и HTML-страницы, но
+читаются через values_list() без создания моделей и кодируются
+вручную: кодировщик каждого поля выбирается заранее, и строка JSON
+собирается конкатенацией. Параметр ?fields=id,text,... оставляет в
+ответе только нужные поля.
+"""
+from json.encoder import encode_basestring
+
+from django.http import HttpResponse, JsonResponse
+
+from core.decorators import (anonymous_cache_page, conditional_page,
+                             query_budget)
+
+from .caching import (FEED_CACHE_TIMEOUT, FEED_PROXY_MAX_AGE,
+                      group_generations, group_modified, index_generations,
+                      index_modified, post_generations, post_modified,
+                      profile_generations, profile_modified)
+from .models import Group, Post, User
+from .utils import get_page_context
+
+
+def _int(value):
+    return str(value)
+
+
+def _string(value):
+    return 'null' if value is None else encode_basestring(value)
+
+
+def _datetime(value):
+    return encode_basestring(value.isoformat())
+
+
+def _image(name):
+    if not name:
+        return 'null'
+    return encode_basestring(Post._meta.get_field('image').storage.url(name))
+
+
+# Поле ответа: (путь для values_list, кодировщик значения).
+POST_FIELDS = {
+    'id': ('pk', _int),
+    'text': ('text', _string),
+    'pub_date': ('pub_date', _datetime),
+    'author': ('author__username', _string),
+    'group': ('group__slug', _string),
+    'image': ('image', _image),
+    'comments_count': ('comments_count', _int),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def selected_fields(request):
+    """Поля из ?fields= в порядке POST_FIELDS, по умолчанию все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(POST_FIELDS)
+    names = set(value.split(','))
+    unknown = names - set(POST_FIELDS)
+    if unknown:
+        raise FieldsError(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown))
+        )
+    return [name for name in POST_FIELDS if name in names]
+
+
+def encode_rows(rows, fields):
+    """JSON-массив объектов из кортежей values_list в порядке fields."""
+    encoders = [
+        (encode_basestring(name) + ':', POST_FIELDS[name][1])
+        for name in fields
+    ]
+    return '[' + ','.join(
+        '{' + ','.join(
+            key + encode(value)
+            for (key, encode), value in zip(encoders, row)
+        ) + '}'
+        for row in rows
+    ) + ']'
+
+
+def _json(content, status=200):
+    return HttpResponse(
+        content, content_type='application/json', status=status
+    )
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def feed_response(request, queryset):
+    try:
+        fields = selected_fields(request)
+    except FieldsError as error:
+        return _error(str(error))
+    queryset = queryset.values_list(
+        *(POST_FIELDS[name][0] for name in fields)
+    )
+    page_obj = get_page_context(queryset, request)['page_obj']
+    has_next = 'true' if page_obj.has_next() else 'false'
+    return _json(
+        f'{{"page":{page_obj.number},'
+        f'"num_pages":{page_obj.paginator.num_pages},'
+        f'"has_next":{has_next},'
+        f'"results":{encode_rows(page_obj, fields)}}}'
+    )
+
+
+@conditional_page(index_generations, index_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, index_generations)
+@query_budget(4)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@conditional_page(group_generations, group_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, group_generations)
+@query_budget(5)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return _error('Группа не найдена.', status=404)
+    return feed_response(request, group.posts.all())
+
+
+@conditional_page(profile_generations, profile_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, profile_generations)
+@query_budget(5)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return _error('Автор не найден.', status=404)
+    return feed_response(request, author.posts.all())
+
+
+@conditional_page(post_generations, post_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, post_generations)
+@query_budget(3)
+def post_detail(request, post_id):
+    try:
+        fields = selected_fields(request)
+    except FieldsError as error:
+        return _error(str(error))
+    row = Post.objects.filter(pk=post_id).values_list(
+        *(POST_FIELDS[name][0] for name in fields)
+    ).first()
+    if row is None:
+        return _error('Пост не найден.', status=404)
+    return _json(encode_rows([row], fields)[1:-1])
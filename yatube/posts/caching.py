@@ -0,0 +1,151 @@
+"""Двухуровневый кеш лент с инвалидацией по событиям.
+
+Анонимам страницы лент отдаются из кеша целиком (anonymous_cache_page).
+Авторизованным персональная «оболочка» (шапка, кнопки подписки)
+рендерится заново, а из кеша берётся только общий для всех список
+постов — фрагмент {% cache %} с ключом из feed_cache_context.
+
+В каждый ключ входят «поколения» лент: index, group:<slug>,
+profile:<username>, post:<id>, follow:<user_id>. Сигналы posts.signals
+увеличивают поколение при изменении данных, старые записи становятся
+недостижимы сразу, поэтому срок жизни кеша можно делать большим.
+
+Те же поколения служат валидаторами условных запросов: ETag строится из
+них, а Last-Modified — из времени последнего изменения ленты, которое
+bump_generations запоминает рядом с поколением.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+FEED_CACHE_TIMEOUT: int = 60 * 60
+# Сколько секунд обратный прокси может отдавать анонимную страницу
+# без перепроверки: он не узнаёт о событиях, сбрасывающих поколения.
+FEED_PROXY_MAX_AGE: int = 10
+GENERATION_TIMEOUT = None
+
+
+def _generation_key(name):
+    return f'feed_generation:{name}'
+
+
+def _modified_key(name):
+    return f'feed_modified:{name}'
+
+
+def _initial_generation():
+    # Поколение, вытесненное из кеша, не должно начаться заново с уже
+    # использованного значения, поэтому стартуем от текущего времени.
+    return int(time.time() * 1000)
+
+
+def get_generations(*names):
+    """Текущие поколения лент в порядке names.
+
+    Только читает кеш: ключи и ETag считаются до view, в том числе для
+    несуществующих slug и id, и запись для каждого из них засоряла бы
+    кеш вечными ключами. Ленте, которую ещё не меняли, соответствует
+    поколение 0; записывает поколения только bump_generations.
+    """
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    return [values.get(key, 0) for key in keys]
+
+
+def bump_generations(*names):
+    """Делает недействительными все закешированные страницы лент.
+
+    Внутри транзакции поколения меняются сразу и ещё раз после её
+    фиксации: до коммита параллельный читатель видит старые данные и
+    мог закешировать их под новым поколением.
+    """
+    names = set(names)
+    _bump(names)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(names))
+
+
+def _bump(names):
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), GENERATION_TIMEOUT)
+    now = int(time.time())
+    cache.set_many(
+        {_modified_key(name): now for name in names}, GENERATION_TIMEOUT
+    )
+
+
+def last_modified(*names):
+    """Время последнего изменения любой из лент names.
+
+    Для ленты, чьё время не записано или вытеснено из кеша, считаем
+    изменением текущий момент: лишний полный ответ лучше ложного 304.
+    Как и get_generations, ничего не записывает.
+    """
+    keys = [_modified_key(name) for name in names]
+    values = cache.get_many(keys)
+    now = int(time.time())
+    return datetime.fromtimestamp(
+        max(values.get(key, now) for key in keys), timezone.utc
+    )
+
+
+def generations_key(*names):
+    return ':'.join(
+        f'{name}={value}'
+        for name, value in zip(names, get_generations(*names))
+    )
+
+
+def feed_cache_context(page_context, *names):
+    """Ключ фрагмента со списком постов для шаблона.
+
+    names — поколения, от которых зависит лента; к ним добавляется
+    позиция страницы: номер или курсор.
+    """
+    paginator = page_context['paginator']
+    if getattr(paginator, 'cursor_mode', False):
+        position = paginator.cursor or ''
+    else:
+        position = page_context['page_obj'].number
+    return {
+        'feed_cache_key': f'{generations_key(*names)}:{position}',
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+
+
+def index_generations(request):
+    return generations_key('index')
+
+
+def group_generations(request, slug):
+    return generations_key(f'group:{slug}')
+
+
+def profile_generations(request, username):
+    return generations_key(f'profile:{username}')
+
+
+def post_generations(request, post_id):
+    return generations_key(f'post:{post_id}', 'index')
+
+
+def index_modified(request):
+    return last_modified('index')
+
+
+def group_modified(request, slug):
+    return last_modified(f'group:{slug}')
+
+
+def profile_modified(request, username):
+    return last_modified(f'profile:{username}')
+
+
+def post_modified(request, post_id):
+    return last_modified(f'post:{post_id}', 'index')
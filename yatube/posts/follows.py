@@ -0,0 +1,80 @@
+"""Граф подписок с кешем множеств авторов на пользователя.
+
+Множество id авторов, на которых подписан пользователь, читается из БД
+одним запросом и лежит в общем кеше, поэтому вопрос «на кого из этих
+авторов он подписан» для целой страницы решается без запросов. Сигналы
+posts.signals сбрасывают запись при любой подписке и отписке, в том
+числе через follow_many и unfollow_many.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, User
+
+FOLLOWEES_CACHE_TIMEOUT: int = 60 * 60 * 24
+MAX_BATCH_FOLLOWS: int = 100
+
+
+def _followees_key(user_id):
+    return f'followees:{user_id}'
+
+
+def followee_ids(user_id):
+    """frozenset id авторов, на которых подписан пользователь."""
+    key = _followees_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        ))
+        cache.set(key, ids, FOLLOWEES_CACHE_TIMEOUT)
+    return frozenset(ids)
+
+
+def forget_followees(user_id):
+    """Сбрасывает множество подписок сразу и, внутри транзакции, ещё
+    раз после фиксации: до коммита параллельный запрос мог закешировать
+    его старым."""
+    key = _followees_key(user_id)
+    cache.delete(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def following_among(user, author_ids):
+    """Те из author_ids, на кого подписан user; для анонима — пусто."""
+    if not user.is_authenticated:
+        return set()
+    return followee_ids(user.pk).intersection(author_ids)
+
+
+def is_following(user, author_id):
+    return author_id in following_among(user, (author_id,))
+
+
+def _authors(user, usernames):
+    return User.objects.filter(
+        username__in=list(usernames)[:MAX_BATCH_FOLLOWS]
+    ).exclude(pk=user.pk)
+
+
+def follow_many(user, usernames):
+    """Подписывает user на авторов из usernames, возвращает их id.
+
+    Подписки создаются по одной, чтобы сигналы обновили счётчики и
+    ленты, но в одной транзакции и без запросов для уже существующих.
+    """
+    authors = list(_authors(user, usernames).values_list('pk', flat=True))
+    existing = followee_ids(user.pk)
+    with transaction.atomic():
+        for author_id in authors:
+            if author_id not in existing:
+                Follow.objects.get_or_create(user=user, author_id=author_id)
+    return set(authors)
+
+
+def unfollow_many(user, usernames):
+    """Отписывает user от авторов из usernames одним DELETE."""
+    Follow.objects.filter(
+        user=user, author__in=_authors(user, usernames)
+    ).delete()
@@ -1,10 +1,14 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from .images import normalize_image, save_variants
 from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
+    image_variants = None
+
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
@@ -17,6 +21,23 @@ class PostForm(forms.ModelForm):
             'text': 'Текст нового поста',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, self.image_variants = normalize_image(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        if self.image_variants is not None:
+            post.image_variants = save_variants(self.image_variants)
+        elif not post.image:
+            post.image_variants = ''
+        if commit:
+            post.save()
+            self.save_m2m()
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,178 @@
+"""Обработка картинок постов при загрузке.
+
+Загруженный файл не сохраняется как есть: поворот по EXIF применяется к
+пикселям, метаданные отбрасываются, стороны ограничиваются
+MAX_IMAGE_SIDE, и картинка пережимается (фото — в JPEG, графика и
+картинки с прозрачностью — в PNG). Дополнительно строятся варианты
+ширины VARIANT_WIDTHS с пропорциями ленты для srcset — в WebP, если
+Pillow собран с его поддержкой.
+
+Размер в пикселях проверяется по заголовку до декодирования, а число
+одновременно декодируемых картинок в процессе ограничено, чтобы
+загрузки не съели память воркера.
+"""
+import hashlib
+import os
+import re
+import threading
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+MAX_UPLOAD_SIZE: int = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS: int = 40_000_000
+MAX_IMAGE_SIDE: int = 2048
+JPEG_QUALITY: int = 85
+VARIANT_QUALITY: int = 80
+# Пропорции миниатюры 960x339 из шаблонов лент.
+VARIANT_ASPECT = (960, 339)
+VARIANT_WIDTHS = (480, 960, 1440)
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+VARIANTS_DIR = 'posts/variants'
+IMAGE_PROCESSING_SLOTS: int = 2
+IMAGE_SLOT_TIMEOUT: int = 10
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp',
+}
+
+VARIANT_NAME = re.compile(
+    rf'{VARIANTS_DIR}/[0-9a-f]+-(\d+)\.({"|".join(CONTENT_TYPES)})'
+)
+
+_slots = threading.BoundedSemaphore(IMAGE_PROCESSING_SLOTS)
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _open(upload):
+    if upload.size > MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            f'Файл больше {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.'
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        image = None
+    if image is None or image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ValidationError('Слишком большое разрешение картинки.')
+    return image
+
+
+def normalize_image(upload):
+    """Пережимает загруженную картинку.
+
+    Возвращает новый файл для ImageField и словарь {ширина: байты}
+    вариантов для srcset. Анимированные картинки сохраняются без
+    изменений и без вариантов.
+    """
+    image = _open(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload, {}
+    if not _slots.acquire(timeout=IMAGE_SLOT_TIMEOUT):
+        raise ValidationError(
+            'Сервер занят обработкой картинок, попробуйте ещё раз.'
+        )
+    try:
+        return _normalize(image, upload.name)
+    finally:
+        _slots.release()
+
+
+def _normalize(image, name):
+    alpha = _has_alpha(image)
+    lossless = alpha or image.format in ('PNG', 'GIF')
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+    if lossless:
+        image_format, options = 'PNG', {'optimize': True}
+    else:
+        image_format, options = 'JPEG', {
+            'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True,
+        }
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    stem = os.path.splitext(os.path.basename(name))[0]
+    content = ContentFile(
+        _encode(image, image_format, **options),
+        name=f'{stem}.{EXTENSIONS[image_format]}',
+    )
+    return content, _make_variants(image)
+
+
+def _make_variants(image):
+    if VARIANT_FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    variants = {}
+    for width in VARIANT_WIDTHS:
+        if width > image.width:
+            break
+        height = round(width * VARIANT_ASPECT[1] / VARIANT_ASPECT[0])
+        variant = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        variants[width] = _encode(
+            variant, VARIANT_FORMAT, quality=VARIANT_QUALITY
+        )
+    return variants
+
+
+def save_variants(variants):
+    """Сохраняет варианты в хранилище и возвращает значение для
+    Post.image_variants: имена файлов через пробел.
+
+    Имена строятся по содержимому, так что одинаковые варианты
+    записываются один раз.
+    """
+    names = []
+    extension = EXTENSIONS[VARIANT_FORMAT]
+    for width, data in sorted(variants.items()):
+        digest = hashlib.sha1(data).hexdigest()
+        name = f'{VARIANTS_DIR}/{digest}-{width}.{extension}'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        names.append(name)
+    return ' '.join(names)
+
+
+def variant_sources(image_variants):
+    """Атрибуты <source> для сохранённых вариантов или None."""
+    variants = [
+        (name, match.group(1), match.group(2))
+        for name, match in (
+            (name, VARIANT_NAME.fullmatch(name))
+            for name in image_variants.split()
+        )
+        if match
+    ]
+    if not variants:
+        return None
+    srcset = ', '.join(
+        f'{default_storage.url(name)} {width}w' for name, width, _ in variants
+    )
+    return {'type': CONTENT_TYPES[variants[0][2]], 'srcset': srcset}
+
+
+def feed_variant(image_variants):
+    """Имя варианта шириной с миниатюру ленты или None."""
+    for name in image_variants.split():
+        match = VARIANT_NAME.fullmatch(name)
+        if match and int(match.group(1)) == VARIANT_ASPECT[0]:
+            return name
+    return None
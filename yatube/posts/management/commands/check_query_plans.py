@@ -0,0 +1,143 @@
+import inspect
+import re
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import views
+from posts.models import Follow, Post, User
+from posts.utils import CURSOR_NEXT, encode_cursor
+
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+# Ленты проверяются с пустым кешем: иначе закешированные фрагменты и
+# количества скрывают запросы, и результат зависит от прошлых запусков.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет ленты через их view и проверяет EXPLAIN QUERY PLAN '
+        'каждого запроса: полный скан таблицы или сортировка во временном '
+        'B-дереве считаются ошибкой, полный обход индекса — тоже, если '
+        'у запроса нет LIMIT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Пользователь для /follow/ и профиля, по умолчанию '
+                 'подписчик с наибольшим id.',
+        )
+        parser.add_argument(
+            '--popular-username',
+            help='Подписчик популярного автора для слитой ленты /follow/, '
+                 'по умолчанию последний такой подписчик.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка рассчитана на EXPLAIN QUERY PLAN '
+                               'из SQLite.')
+        reader, post = self.get_fixtures(options['username'])
+        popular_reader = self.get_popular_reader(options['popular_username'])
+        if popular_reader is None:
+            self.stderr.write(
+                'Нет подписчиков популярных авторов: слитая лента '
+                '/follow/ не проверена.'
+            )
+        tables = set(connection.introspection.table_names())
+        problems = []
+        with override_settings(CACHES=NO_CACHE):
+            captured = list(self.capture(reader, popular_reader, post))
+        for name, queries in captured:
+            for sql in queries:
+                limited = bool(LIMIT.search(sql))
+                for detail in self.explain(sql):
+                    if self.is_bad_step(detail, tables, limited):
+                        problems.append((name, detail, sql))
+        for name, detail, sql in problems:
+            self.stderr.write(f'{name}: {detail}\n    {sql}')
+        if problems:
+            raise CommandError(
+                f'Запросов без подходящего индекса: {len(problems)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
+
+    def get_fixtures(self, username):
+        if username:
+            reader = User.objects.filter(username=username).first()
+        else:
+            follow = Follow.objects.order_by('-pk').first()
+            reader = follow.user if follow else User.objects.first()
+        post = Post.objects.exclude(group=None).order_by('-pk').first()
+        if reader is None or post is None:
+            raise CommandError(
+                'Нужны хотя бы один пользователь и пост в группе.'
+            )
+        return reader, post
+
+    def get_popular_reader(self, username):
+        if username:
+            return User.objects.filter(username=username).first()
+        follow = Follow.objects.filter(
+            author__popular__isnull=False
+        ).order_by('-pk').first()
+        return follow.user if follow else None
+
+    def capture(self, reader, popular_reader, post):
+        """Вызывает каждую ленту и возвращает её SELECT-запросы."""
+        factory = RequestFactory()
+        author = post.author.username
+        cursor = encode_cursor(CURSOR_NEXT, post.pub_date, post.pk)
+        anonymous = AnonymousUser()
+        calls = [
+            ('index', anonymous, views.index, {}, {}),
+            ('index page 2', anonymous, views.index, {'page': 2}, {}),
+            ('group_posts', anonymous, views.group_posts, {}, {
+                'slug': post.group.slug
+            }),
+            ('profile', anonymous, views.profile, {}, {'username': author}),
+            ('post_detail', anonymous, views.post_detail, {}, {
+                'post_id': post.pk
+            }),
+            ('follow_index', reader, views.follow_index, {}, {}),
+            ('follow_index cursor', reader, views.follow_index, {
+                'cursor': cursor
+            }, {}),
+        ]
+        if popular_reader is not None:
+            calls += [
+                ('follow_index popular', popular_reader,
+                 views.follow_index, {}, {}),
+                ('follow_index popular cursor', popular_reader,
+                 views.follow_index, {'cursor': cursor}, {}),
+            ]
+        for name, user, view, params, kwargs in calls:
+            request = factory.get('/', params)
+            request.user = user
+            with CaptureQueriesContext(connection) as captured:
+                inspect.unwrap(view)(request, **kwargs)
+            yield name, [
+                query['sql'] for query in captured.captured_queries
+                if query['sql'].lstrip().upper().startswith('SELECT')
+            ]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def is_bad_step(self, detail, tables, limited):
+        """Сортировка во временном B-дереве, скан таблицы или полный
+        обход индекса без LIMIT, который остановил бы его."""
+        if 'TEMP B-TREE' in detail:
+            return True
+        words = detail.split()
+        if len(words) < 2 or words[0] != 'SCAN' or words[1] not in tables:
+            return False
+        return 'USING' not in detail or not limited
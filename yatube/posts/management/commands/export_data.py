@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS, FORMATS, export_lines, post_filters
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии или подписки в NDJSON или CSV '
+        'потоком, не загружая таблицу в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTS)
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+            dest='export_format',
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument('--author', help='Только посты автора.')
+        parser.add_argument('--group', help='Только посты группы (slug).')
+        parser.add_argument(
+            '--since', help='Посты с этой даты (ГГГГ-ММ-ДД) включительно.'
+        )
+        parser.add_argument(
+            '--until', help='Посты по эту дату (ГГГГ-ММ-ДД) включительно.'
+        )
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        filters = None
+        if kind == 'posts':
+            try:
+                filters = post_filters(
+                    options['author'], options['group'],
+                    options['since'], options['until'],
+                )
+            except ValueError as error:
+                raise CommandError(error)
+        lines = export_lines(kind, options['export_format'], filters)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,204 @@
+import itertools
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts.models import Group, Post, User
+
+# Показатель степенного закона: у автора с рангом r вес 1 / r ** ZIPF.
+ZIPF_EXPONENT: float = 1.1
+IMAGE_POOL_SIZE: int = 20
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """Накопленные веса для random.choices: немногие получают почти
+    всё, как авторы, подписки и обсуждения в живой соцсети."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных: пользователей, группы, посты '
+        'с картинками, подписки и комментарии со степенным '
+        'распределением. Данные пишутся через import_data, поэтому '
+        'счётчики, ленты и поисковый индекс сразу согласованы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.rand = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        usernames = self.create_users(options['users'])
+        slugs = self.create_groups(options['groups'])
+        directory = tempfile.mkdtemp(prefix='yatube-dataset-')
+        try:
+            posts = self.write_posts(
+                directory, usernames, slugs, options
+            )
+            self.write_follows(directory, usernames, options['follows'])
+            self.write_comments(
+                directory, usernames, posts, options['comments']
+            )
+            for kind in ('posts', 'follows', 'comments'):
+                call_command(
+                    'import_data', kind, os.path.join(directory, kind),
+                    batch_size=self.batch_size, stdout=self.stdout,
+                    stderr=self.stderr,
+                )
+        finally:
+            for kind in ('posts', 'follows', 'comments'):
+                path = os.path.join(directory, kind)
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+
+    def create_users(self, count):
+        """Пользователи без пароля; имена упорядочены по популярности."""
+        password = make_password(None)
+        start = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        users = [
+            User(
+                username=f'{self.fake.user_name()}{start + number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            )
+            for number in range(count)
+        ]
+        User.objects.bulk_create(users)
+        self.stdout.write(f'Пользователей: {count}')
+        return [user.username for user in users]
+
+    def create_groups(self, count):
+        start = Group.objects.aggregate(last=Max('pk'))['last'] or 0
+        groups = [
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'group-{start + number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(count)
+        ]
+        Group.objects.bulk_create(groups)
+        self.stdout.write(f'Групп: {count}')
+        return [group.slug for group in groups]
+
+    def image_pool(self):
+        """Несколько картинок на все посты: одинаковые загрузки и так
+        хранятся одним файлом."""
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for number in range(IMAGE_POOL_SIZE):
+            image = Image.new('RGB', (1200, 800), tuple(
+                self.rand.randrange(256) for _ in range(3)
+            ))
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            names.append(storage.save(
+                f'posts/dataset-{number}.jpg', ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def write_posts(self, directory, usernames, slugs, options):
+        """Пишет posts и возвращает [(id, pub_date)] для комментариев."""
+        images = self.image_pool() if options['image_share'] > 0 else []
+        weights = zipf_weights(len(usernames))
+        now = timezone.now()
+        first_id = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        posts = []
+        with open(os.path.join(directory, 'posts'), 'w',
+                  encoding='utf-8') as output:
+            for number in range(options['posts']):
+                pub_date = now - timedelta(
+                    seconds=self.rand.uniform(0, options['days'] * 86400)
+                )
+                row = {
+                    'id': first_id + number,
+                    'author': self.rand.choices(
+                        usernames, cum_weights=weights
+                    )[0],
+                    'text': self.fake.text(
+                        max_nb_chars=self.rand.choice((80, 200, 600))
+                    ),
+                    'pub_date': pub_date.isoformat(),
+                }
+                if slugs and self.rand.random() < 0.5:
+                    row['group'] = self.rand.choice(slugs)
+                if images and self.rand.random() < options['image_share']:
+                    row['image'] = self.rand.choice(images)
+                output.write(json.dumps(row, ensure_ascii=False) + '\n')
+                posts.append((row['id'], pub_date))
+        return posts
+
+    def write_follows(self, directory, usernames, count):
+        weights = zipf_weights(len(usernames))
+        pairs = set()
+        # Пар меньше, чем просят, если пользователей мало.
+        for _ in range(count * 2):
+            if len(pairs) >= count:
+                break
+            user = self.rand.choice(usernames)
+            author = self.rand.choices(usernames, cum_weights=weights)[0]
+            if user != author:
+                pairs.add((user, author))
+        with open(os.path.join(directory, 'follows'), 'w',
+                  encoding='utf-8') as output:
+            for user, author in sorted(pairs):
+                output.write(
+                    json.dumps({'user': user, 'author': author}) + '\n'
+                )
+
+    def write_comments(self, directory, usernames, posts, count):
+        if not posts:
+            count = 0
+        # Обсуждают в основном немногие посты, чаще свежие.
+        ordered = sorted(posts, key=lambda post: post[1], reverse=True)
+        weights = zipf_weights(len(ordered), exponent=0.8)
+        now = timezone.now()
+        with open(os.path.join(directory, 'comments'), 'w',
+                  encoding='utf-8') as output:
+            for _ in range(count):
+                post_id, pub_date = self.rand.choices(
+                    ordered, cum_weights=weights
+                )[0]
+                created = min(now, pub_date + timedelta(
+                    seconds=self.rand.expovariate(1 / 3600)
+                ))
+                output.write(json.dumps({
+                    'post': post_id,
+                    'author': self.rand.choice(usernames),
+                    'text': self.fake.sentence(),
+                    'created': created.isoformat(),
+                }, ensure_ascii=False) + '\n')
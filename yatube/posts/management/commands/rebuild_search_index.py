@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Post
+
+FTS_TABLE = search.FTS_TABLE
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает полнотекстовый индекс постов: после загрузки данных '
+        'в обход сигналов или если индекс разошёлся с таблицей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько постов добавлять в индекс одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый поиск работает только на '
+                               'SQLite с FTS5.')
+        batch_size = options['batch_size']
+        pks = Post.objects.order_by('pk').values_list('pk', flat=True)
+        indexed = 0
+        # Одна транзакция: до её конца поиск видит старый индекс.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            last_pk = None
+            while True:
+                batch = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+                batch = list(batch[:batch_size])
+                if not batch:
+                    break
+                search.index_posts(batch[0], batch[-1])
+                indexed += len(batch)
+                last_pk = batch[-1]
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed}'
+        ))
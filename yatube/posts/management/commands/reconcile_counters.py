@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+def count_of(model, field):
+    """Подзапрос с точным количеством строк model, ссылающихся на pk."""
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    counts = counts.values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+COUNTERS = (
+    (Group, {'posts_count': (Post, 'group')}),
+    (Post, {'comments_count': (Comment, 'post')}),
+    (UserStats, {
+        'posts_count': (Post, 'author'),
+        'followers_count': (Follow, 'author'),
+        'following_count': (Follow, 'user'),
+    }),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и чинит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        created = self.create_missing_stats(batch_size)
+        if created:
+            self.stdout.write(f'UserStats: создано строк {created}')
+        for model, fields in COUNTERS:
+            fixed = self.reconcile(model, fields, batch_size)
+            self.stdout.write(
+                f'{model.__name__}: исправлено строк {fixed}'
+            )
+
+    def create_missing_stats(self, batch_size):
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True
+        )
+        created = 0
+        while True:
+            batch = list(missing[:batch_size])
+            if not batch:
+                return created
+            UserStats.objects.bulk_create(
+                (UserStats(user_id=pk) for pk in batch),
+                ignore_conflicts=True,
+            )
+            created += len(batch)
+
+    def reconcile(self, model, fields, batch_size):
+        """Проходит таблицу по pk пачками и обновляет только строки,
+        где сохранённое значение расходится с точным."""
+        actual = {
+            f'actual_{field}': count_of(*source)
+            for field, source in fields.items()
+        }
+        drift = Q()
+        for field in fields:
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+        pks = model.objects.order_by('pk').values_list('pk', flat=True)
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return fixed
+            last_pk = batch[-1]
+            with transaction.atomic():
+                drifted = model.objects.filter(pk__in=batch).annotate(
+                    **actual
+                ).filter(drift).values_list('pk', flat=True)
+                drifted = list(drifted)
+                if drifted:
+                    model.objects.filter(pk__in=drifted).update(**{
+                        field: count_of(*source)
+                        for field, source in fields.items()
+                    })
+            fixed += len(drifted)
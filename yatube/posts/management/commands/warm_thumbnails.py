@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import make_thumbnails
+
+
+def warm(name, force):
+    try:
+        make_thumbnails(name, force=force)
+    except Exception as error:
+        return name, error
+    return name, None
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры картинок уже опубликованных постов в нескольких '
+        'процессах, чтобы первый читатель не ждал их генерации.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько процессов строят миниатюры; 1 — без пула.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалить существующие миниатюры и построить их заново.',
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        force = options['force']
+        if options['workers'] > 1:
+            # Дочерние процессы должны открыть свои соединения с базой,
+            # а не делить унаследованные от родителя.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                results = list(executor.map(
+                    warm, names, [force] * len(names), chunksize=16
+                ))
+        else:
+            results = [warm(name, force) for name in names]
+        failed = [(name, error) for name, error in results if error]
+        for name, error in failed:
+            self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {len(names) - len(failed)}, '
+            f'с ошибками: {len(failed)}'
+        ))
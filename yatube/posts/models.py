@@ -1,9 +1,28 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
+
+from core.storage import ContentAddressedStorage
+
+from .images import variant_sources
+from .thumbnails import feed_thumbnail
 
 User = get_user_model()
 
 
+def change_counters(queryset, deltas):
+    """Меняет счётчики UPDATE-ом с F(), не уводя их ниже нуля.
+
+    Возвращает число обновлённых строк.
+    """
+    values = {}
+    for field, delta in deltas.items():
+        values[field] = models.F(field) + delta
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**values)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(
@@ -13,11 +32,22 @@ class Group(models.Model):
         verbose_name='link'
     )
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов', default=0, editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним запросом с постом."""
+        return self.select_related('author', 'group').defer(
+            'author__password', 'group__description'
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -45,16 +75,45 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки', blank=True, editable=False,
+        help_text='Файлы вариантов разной ширины для srcset через пробел'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    @property
+    def image_sources(self):
+        return variant_sources(self.image_variants)
+
+    @cached_property
+    def thumbnail(self):
+        # Ленты заполняют миниатюры страницы заранее: resolve_thumbnails.
+        return feed_thumbnail(self.image, self.image_variants)
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'
+            ),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -84,6 +143,11 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -106,3 +170,93 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique following'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами posts.signals."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    @classmethod
+    def of(cls, user):
+        """Счётчики пользователя, строка создаётся при первом обращении."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls.objects.get_or_create(user=user)[0]
+
+    @classmethod
+    def change(cls, user_id, **deltas):
+        """Атомарно прибавляет deltas к счётчикам одним UPDATE."""
+        if not change_counters(cls.objects.filter(user_id=user_id), deltas):
+            if any(delta < 0 for delta in deltas.values()):
+                return
+            cls.objects.get_or_create(user_id=user_id)
+            change_counters(cls.objects.filter(user_id=user_id), deltas)
+
+
+class PopularAuthor(models.Model):
+    """Автор, чьи посты подмешиваются в ленты подписчиков при чтении."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='popular',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique timeline entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            ),
+        ]
@@ -0,0 +1,144 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст постов дублируется в виртуальной таблице posts_post_fts с rowid,
+равным id поста; сигналы posts.signals обновляют её при сохранении и
+удалении, а команда rebuild_search_index пересобирает целиком. Каждое
+слово запроса ищется как префикс, результаты упорядочены по bm25 и
+листаются курсором (rank, rowid) без OFFSET.
+
+На других СУБД таблица не создаётся и поиск ничего не находит.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+SEARCH_RESULTS_NUMBER: int = 10
+SNIPPET_TOKENS: int = 24
+MAX_QUERY_WORDS: int = 8
+WORD = re.compile(r'\w+')
+# Границы совпадений в snippet(): управляющие символы не встречаются в
+# тексте после escape и заменяются на <mark> уже после экранирования.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(text):
+    """Выражение MATCH: все слова обязательны, каждое — как префикс.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 во вводе
+    пользователя не интерпретируется.
+    """
+    words = WORD.findall(text.lower())[:MAX_QUERY_WORDS]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def index_posts(first_pk, last_pk):
+    """Индексирует посты с pk от first_pk до last_pk включительно
+    одним INSERT ... SELECT."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid BETWEEN %s AND %s',
+            [first_pk, last_pk],
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post WHERE id BETWEEN %s AND %s',
+            [first_pk, last_pk],
+        )
+
+
+def unindex_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def matching_ids(text):
+    """Подзапрос с id постов, подходящих под запрос, для filter()."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [match_query(text)],
+    )
+
+
+def encode_cursor(rank, pk):
+    raw = f'{rank!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Позиция (rank, pk) из курсора, для битого курсора — None."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk = raw.split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def search_posts(text, cursor=None, limit=SEARCH_RESULTS_NUMBER):
+    """Страница результатов поиска и курсор следующей страницы.
+
+    У каждого поста заполнен post.snippet — фрагмент текста с
+    подсвеченными совпадениями.
+    """
+    query = match_query(text)
+    if not query or not is_available():
+        return [], None
+    params = [MARK_START, MARK_END, SNIPPET_TOKENS, query]
+    after = ''
+    position = decode_cursor(cursor)
+    if position is not None:
+        rank, pk = position
+        after = 'AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, pk]
+    with connection.cursor() as db:
+        db.execute(
+            f"SELECT rowid, rank, snippet({FTS_TABLE}, 0, %s, %s, '…', %s) "
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {after} '
+            f'ORDER BY rank, rowid LIMIT %s',
+            params + [limit + 1],
+        )
+        rows = db.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+    results = []
+    for pk, _, snippet in rows:
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    return results, next_cursor
@@ -0,0 +1,231 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import follows, search, timeline
+from .caching import bump_generations
+from .models import (Comment, Follow, Group, Post, User, UserStats,
+                     change_counters)
+from .thumbnails import delete_image
+
+logger = logging.getLogger(__name__)
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        change_counters(
+            Group.objects.filter(pk=group_id), {'posts_count': delta}
+        )
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        (
+            instance._saved_group_id,
+            instance._saved_image,
+            instance._saved_image_variants,
+        ) = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image', 'image_variants'
+        ).first() or (None, '', '')
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.change(instance.author_id, posts_count=1)
+        old_group_id = None
+    else:
+        old_group_id = getattr(instance, '_saved_group_id', None)
+    if old_group_id != instance.group_id:
+        change_group_posts(old_group_id, -1)
+        change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserStats.change(instance.author_id, posts_count=-1)
+    change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counters(Post.objects.filter(pk=instance.post_id), {
+            'comments_count': 1
+        })
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counters(Post.objects.filter(pk=instance.post_id), {
+        'comments_count': -1
+    })
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.change(instance.author_id, followers_count=1)
+        UserStats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    UserStats.change(instance.author_id, followers_count=-1)
+    UserStats.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.add_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove_follow(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_followees(sender, instance, raw=False, **kwargs):
+    if not raw:
+        follows.forget_followees(instance.user_id)
+
+
+def invalidate_post_feeds(post, *group_ids):
+    """Сбрасывает кеш всех лент, в которых показывается пост."""
+    names = ['index', f'post:{post.pk}']
+    names += [
+        f'group:{slug}' for slug in Group.objects.filter(
+            pk__in=[pk for pk in group_ids if pk is not None]
+        ).values_list('slug', flat=True)
+    ]
+    names += [
+        f'profile:{username}' for username in User.objects.filter(
+            pk=post.author_id
+        ).values_list('username', flat=True)
+    ]
+    bump_generations(*names)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_post_feeds(
+            instance,
+            instance.group_id,
+            getattr(instance, '_saved_group_id', None),
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    invalidate_post_feeds(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_comments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_generations(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feeds(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    names = [f'follow:{instance.user_id}']
+    names += [
+        f'profile:{username}' for username in User.objects.filter(
+            pk__in=[instance.user_id, instance.author_id]
+        ).values_list('username', flat=True)
+    ]
+    bump_generations(*names)
+
+
+@receiver(pre_save, sender=Group)
+def remember_saved_group(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        instance._saved_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # После смены slug страницы под старым адресом тоже устаревают.
+    slugs = {instance.slug, getattr(instance, '_saved_slug', None)}
+    bump_generations(
+        'index', *(f'group:{slug}' for slug in slugs if slug is not None)
+    )
+
+
+def release_image(name, variants):
+    """Удаляет картинку, её миниатюры и варианты после коммита, если
+    на файл больше не ссылается ни один пост.
+
+    Одинаковые загрузки хранятся одним файлом (ContentAddressedStorage),
+    так что число ссылок — число постов с этим именем.
+    """
+    if not name:
+        return
+
+    def release():
+        if Post.objects.filter(image=name).exists():
+            return
+        try:
+            delete_image(name)
+            for variant in variants.split():
+                default_storage.delete(variant)
+        except (OSError, SuspiciousFileOperation):
+            logger.exception('Не удалось удалить картинку %s', name)
+
+    transaction.on_commit(release)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, created, raw=False, **kwargs):
+    saved_image = getattr(instance, '_saved_image', '')
+    if not raw and saved_image and saved_image != instance.image.name:
+        release_image(saved_image, instance._saved_image_variants)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw and search.is_available():
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    if search.is_available():
+        search.unindex_post(instance.pk)
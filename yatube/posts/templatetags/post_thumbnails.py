@@ -0,0 +1,12 @@
+from django import template
+
+from posts.thumbnails import resolve_thumbnails as resolve
+
+register = template.Library()
+
+
+@register.simple_tag
+def resolve_thumbnails(posts):
+    """Достаёт миниатюры всех постов страницы одним обращением к кешу."""
+    resolve(posts)
+    return ''
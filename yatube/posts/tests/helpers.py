@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def run_on_commit():
+    """Выполняет колбэки transaction.on_commit, добавленные в блоке.
+
+    TestCase не фиксирует свою транзакцию, поэтому без этого сброс
+    кеша после коммита в тестах не происходит.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
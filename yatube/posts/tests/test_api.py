@@ -0,0 +1,95 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..utils import POSTS_NUMBER
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост "{i}"\n',
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(POSTS_NUMBER + 3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.status_code, json.loads(response.content)
+
+    def test_feeds_match_html_pagination(self):
+        urls = (
+            (reverse('posts:api_index'), reverse('posts:index')),
+            (
+                reverse('posts:api_group_list', args=[self.group.slug]),
+                reverse('posts:group_list', args=[self.group.slug]),
+            ),
+            (
+                reverse('posts:api_profile', args=[self.author.username]),
+                reverse('posts:profile', args=[self.author.username]),
+            ),
+        )
+        for api_url, html_url in urls:
+            for page in (1, 2):
+                with self.subTest(url=api_url, page=page):
+                    status, data = self.get_json(api_url, page=page)
+                    html = self.client.get(html_url, {'page': page})
+                    self.assertEqual(status, 200)
+                    self.assertEqual(
+                        [post['id'] for post in data['results']],
+                        [post.pk for post in html.context['page_obj']],
+                    )
+                    self.assertEqual(
+                        data['page'], html.context['page_obj'].number
+                    )
+
+    def test_post_fields_and_selection(self):
+        post = self.posts[1]
+        url = reverse('posts:api_post_detail', args=[post.pk])
+        status, data = self.get_json(url)
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {
+            'id': post.pk,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'author': 'author',
+            'group': 'group',
+            'image': None,
+            'comments_count': 0,
+        })
+        _, data = self.get_json(url, fields='text,id')
+        self.assertEqual(data, {'id': post.pk, 'text': post.text})
+
+    def test_errors(self):
+        status, data = self.get_json(
+            reverse('posts:api_index'), fields='id,password'
+        )
+        self.assertEqual(status, 400)
+        self.assertIn('password', data['error'])
+        for url in (
+            reverse('posts:api_post_detail', args=[0]),
+            reverse('posts:api_group_list', args=['missing']),
+            reverse('posts:api_profile', args=['missing']),
+        ):
+            with self.subTest(url=url):
+                status, data = self.get_json(url)
+                self.assertEqual(status, 404)
+                self.assertIn('error', data)
@@ -0,0 +1,42 @@
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Post, TimelineEntry, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_power_law_dataset_is_consistent(self):
+        call_command(
+            'generate_dataset', users=50, groups=3, posts=400,
+            comments=300, follows=150, image_share=0.25, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 150)
+        per_author = sorted(Counter(
+            Post.objects.values_list('author_id', flat=True)
+        ).values(), reverse=True)
+        self.assertGreater(per_author[0], 5 * per_author[len(per_author) // 2])
+        with_images = Post.objects.exclude(image='').count()
+        self.assertTrue(50 < with_images < 150)
+        self.assertTrue(TimelineEntry.objects.exists())
+        stats = UserStats.objects.order_by('-posts_count').first()
+        self.assertEqual(stats.posts_count, per_author[0])
@@ -0,0 +1,83 @@
+import csv
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост, "{i}"',
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.staff, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.staff, author=cls.author)
+
+    def export(self, *args, **options):
+        output = StringIO()
+        call_command('export_data', *args, stdout=output, **options)
+        return output.getvalue()
+
+    @mock.patch('posts.export.EXPORT_CHUNK_SIZE', 2)
+    def test_ndjson_posts_in_chunks(self):
+        rows = [
+            json.loads(line) for line in self.export('posts').splitlines()
+        ]
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts])
+        self.assertEqual(rows[1]['group'], 'group')
+        self.assertEqual(rows[1]['text'], self.posts[1].text)
+
+    def test_post_filters(self):
+        today = self.posts[0].pub_date.date().isoformat()
+        rows = self.export('posts', group='group', since=today, until=today)
+        self.assertEqual(len(rows.splitlines()), 2)
+        self.assertEqual(self.export('posts', until='2000-01-01'), '')
+        with self.assertRaises(CommandError):
+            self.export('posts', since='вчера')
+
+    def test_csv_comments_and_follows(self):
+        rows = list(csv.reader(StringIO(
+            self.export('comments', export_format='csv')
+        )))
+        self.assertEqual(rows[0], ['id', 'post', 'author', 'created', 'text'])
+        self.assertEqual(rows[1][4], 'Комментарий')
+        rows = list(csv.reader(StringIO(
+            self.export('follows', export_format='csv')
+        )))
+        self.assertEqual(rows[1][1:], ['staff', 'author'])
+
+    def test_view_streams_for_staff_only(self):
+        url = reverse('posts:export', args=['posts'])
+        client = Client()
+        client.force_login(self.author)
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.staff)
+        response = client.get(url, {'format': 'csv', 'author': 'author'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), len(self.posts) + 1)
+        self.assertEqual(
+            client.get(reverse('posts:export', args=['users'])).status_code,
+            404,
+        )
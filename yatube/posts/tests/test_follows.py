@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follows
+from ..models import Follow, UserStats
+from .helpers import run_on_commit
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_following_among_is_one_query_then_cached(self):
+        ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follows.following_among(self.reader, ids),
+                {self.authors[0].pk},
+            )
+        with self.assertNumQueries(0):
+            follows.following_among(self.reader, ids)
+
+    def test_follow_and_unfollow_reset_cache(self):
+        author = self.authors[1]
+        self.assertFalse(follows.is_following(self.reader, author.pk))
+        self.client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        self.assertTrue(follows.is_following(self.reader, author.pk))
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[author.username])
+        )
+        self.assertFalse(follows.is_following(self.reader, author.pk))
+
+    def test_followees_forgotten_again_after_commit(self):
+        author = self.authors[1]
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=author)
+            # Параллельный запрос до коммита кеширует старые подписки.
+            cache.set(
+                follows._followees_key(self.reader.pk),
+                [self.authors[0].pk],
+            )
+        self.assertTrue(follows.is_following(self.reader, author.pk))
+
+    def test_bulk_endpoints(self):
+        usernames = [author.username for author in self.authors]
+        response = self.client.post(
+            reverse('posts:follow_many'),
+            {'username': usernames + [self.reader.username, 'nobody']},
+        )
+        self.assertEqual(response.json(), {'following': usernames})
+        stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(stats.following_count, len(self.authors))
+        response = self.client.post(
+            reverse('posts:unfollow_many'), {'username': usernames[:2]}
+        )
+        self.assertEqual(response.json(), {'following': []})
+        self.assertEqual(
+            set(self.reader.follower.values_list('author', flat=True)),
+            {self.authors[2].pk},
+        )
+        stats.refresh_from_db()
+        self.assertEqual(stats.following_count, 1)
+
+    def test_bulk_endpoints_require_post(self):
+        response = self.client.get(reverse('posts:follow_many'))
+        self.assertEqual(response.status_code, 405)
@@ -1,11 +1,14 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
 from ..models import Comment, Group, Post
@@ -112,9 +115,79 @@ class FormTests(TestCase):
             follow=True
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(Post.objects.filter(
-                        text='Тестовый текст',
-                        image='posts/small.gif').exists())
+        # GIF без анимации пережимается в PNG и называется по содержимому.
+        self.assertRegex(
+            Post.objects.exclude(image='').get(text='Тестовый текст')
+            .image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$'
+        )
+
+    def make_jpeg(self, size, exif=None):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(
+            buffer, 'JPEG', exif=exif or b''
+        )
+        return SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    def test_upload_is_normalized(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет
+        метаданные, а для srcset сохраняются варианты ширины."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Phone'
+        form = PostForm(
+            data={'text': 'Фото'},
+            files={'image': self.make_jpeg((3000, 1000), exif.tobytes())},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.author = self.user
+        post = form.save()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (683, 2048))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn('exif', image.info)
+        names = post.image_variants.split()
+        self.assertEqual(
+            [name.rsplit('-', 1)[1].split('.')[0] for name in names],
+            ['480'],
+        )
+        sources = post.image_sources
+        self.assertIn(' 480w', sources['srcset'])
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом, который удаляется
+        вместе с последним ссылающимся на него постом."""
+        posts = []
+        for text in ('Первый', 'Второй'):
+            form = PostForm(
+                data={'text': text},
+                files={'image': self.make_jpeg((600, 400))},
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            form.instance.author = self.user
+            posts.append(form.save())
+        first, second = posts
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        with mock.patch(
+            'posts.signals.transaction.on_commit', lambda func: func()
+        ):
+            first.delete()
+            self.assertTrue(storage.exists(second.image.name))
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_decompression_bomb_is_rejected(self):
+        """Огромное разрешение отклоняется до декодирования."""
+        buffer = BytesIO()
+        Image.new('1', (8000, 6000)).save(buffer, 'PNG')
+        form = PostForm(data={'text': 'Бомба'}, files={
+            'image': SimpleUploadedFile('bomb.png', buffer.getvalue()),
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
 
 
 class CommentTests(TestCase):
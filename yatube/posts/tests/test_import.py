@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from ..search import search_posts
+
+User = get_user_model()
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            for row in rows:
+                output.write(
+                    row if isinstance(row, str) else json.dumps(row)
+                )
+                output.write('\n')
+        return path
+
+    def run_import(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_data', *args, stdout=stdout, stderr=stderr, **options
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_posts_keep_timestamps_and_update_derived_data(self):
+        path = self.write('posts.ndjson', [
+            {'author': 'author', 'text': 'Старый пост про море',
+             'group': 'group', 'pub_date': '2015-06-01T12:00:00+00:00'},
+            {'author': 'author', 'text': 'Без даты'},
+            {'author': 'nobody', 'text': 'Неизвестный автор'},
+            {'author': 'author', 'text': 'Нет группы', 'group': 'missing'},
+            'не json',
+        ])
+        _, errors = self.run_import('posts', path, batch_size=2)
+        self.assertEqual(len(errors.splitlines()), 3)
+        post = Post.objects.get(text='Старый пост про море')
+        self.assertEqual(
+            post.pub_date, datetime(2015, 6, 1, 12, tzinfo=timezone.utc)
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(search_posts('мор')[0], [post])
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+    def test_export_round_trip_with_create_users(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        exported = {}
+        for kind in ('posts', 'comments', 'follows'):
+            output = StringIO()
+            call_command('export_data', kind, stdout=output)
+            exported[kind] = self.write(f'{kind}.ndjson', [
+                line for line in output.getvalue().splitlines()
+            ])
+        comment = Comment.objects.get()
+        User.objects.exclude(username='author').delete()
+        Post.objects.all().delete()
+        for kind in ('posts', 'comments', 'follows'):
+            self.run_import(kind, exported[kind], create_users=True)
+        self.assertEqual(Post.objects.get().pk, post.pk)
+        imported = Comment.objects.get()
+        self.assertEqual(
+            (imported.pk, imported.created, imported.author.username),
+            (comment.pk, comment.created, 'reader'),
+        )
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=self.author
+        ).exists())
+        self.assertEqual(Post.objects.get().comments_count, 1)
+
+    def test_resume_from_progress_file(self):
+        rows = [
+            {'id': 1000 + i, 'author': 'author', 'text': f'Пост {i}'}
+            for i in range(5)
+        ]
+        path = self.write('posts.ndjson', rows[:3])
+        progress = os.path.join(self.directory.name, 'progress.json')
+        self.run_import(
+            'posts', path, transaction_size=2, progress_file=progress
+        )
+        self.assertEqual(Post.objects.count(), 3)
+        self.write('posts.ndjson', rows)
+        output, _ = self.run_import(
+            'posts', path, transaction_size=2, progress_file=progress
+        )
+        self.assertIn('Продолжаем со строки 4', output)
+        self.assertEqual(Post.objects.count(), 5)
+        output, _ = self.run_import('posts', path)
+        self.assertIn('пропущено 5', output)
+        self.assertEqual(Post.objects.count(), 5)
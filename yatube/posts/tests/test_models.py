@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -29,3 +32,81 @@ class PostModelTest(TestCase):
         for str_method in str_list:
             with self.subTest(str_method=str_method):
                 self.assertEqual(str_method, 'Тестовая группа')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='otherslug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, **expected):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        stats = UserStats.objects.get(user=self.user)
+        reader_stats = UserStats.objects.get(user=self.reader)
+        actual = {
+            'posts': stats.posts_count,
+            'group_posts': self.group.posts_count,
+            'other_group_posts': self.other_group.posts_count,
+            'followers': stats.followers_count,
+            'following': reader_stats.following_count,
+        }
+        self.assertEqual(actual, expected)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании, правке и удалении."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertCounters(
+            posts=1, group_posts=1, other_group_posts=0,
+            followers=1, following=1,
+        )
+        post.group = self.other_group
+        post.save()
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertCounters(
+            posts=1, group_posts=0, other_group_posts=1,
+            followers=1, following=1,
+        )
+        post.delete()
+        Follow.objects.all().delete()
+        self.assertCounters(
+            posts=0, group_posts=0, other_group_posts=0,
+            followers=0, following=0,
+        )
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет разошедшиеся счётчики."""
+        Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        Group.objects.update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        UserStats.objects.filter(user=self.user).update(posts_count=0)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertCounters(
+            posts=1, group_posts=1, other_group_posts=0,
+            followers=1, following=1,
+        )
@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import FTS_TABLE, match_query, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=text)
+            for text in (
+                'Кошка спит на солнце',
+                'Кошки и кошка: кошка гуляет сама по себе',
+                'Собака лает на <кошку>',
+                'Про погоду',
+            )
+        ]
+
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client = Client()
+
+    def test_match_query_quotes_user_input(self):
+        """Синтаксис FTS5 во вводе не интерпретируется."""
+        self.assertEqual(match_query('кошка OR "NEAR(x'), '"кошка"* "or"* '
+                         '"near"* "x"*')
+        self.assertEqual(match_query(' *:- '), '')
+
+    def test_results_are_ranked_and_paginated_by_cursor(self):
+        first, cursor = search_posts('кошк', limit=2)
+        self.assertEqual(first[0], self.posts[1])
+        self.assertIsNotNone(cursor)
+        second, next_cursor = search_posts('кошк', cursor, limit=2)
+        self.assertIsNone(next_cursor)
+        found = {post.pk for post in first + second}
+        self.assertEqual(found, {post.pk for post in self.posts[:3]})
+        self.assertEqual(len(first + second), 3)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'собака'})
+        self.assertContains(response, '<mark>Собака</mark> лает на '
+                                      '&lt;кошку&gt;')
+        self.assertEqual(response.context['posts'], [self.posts[2]])
+
+    def test_broken_cursor_starts_from_first_page(self):
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'погод', 'cursor': '%%%'}
+        )
+        self.assertEqual(response.context['posts'], [self.posts[3]])
+
+    def test_index_follows_saves_and_deletes(self):
+        post = self.posts[3]
+        post.text = 'Про дождь'
+        post.save()
+        self.assertEqual(search_posts('погод')[0], [])
+        self.assertEqual(search_posts('дожд')[0], [post])
+        post.delete()
+        self.assertEqual(search_posts('дожд')[0], [])
+
+    def test_rebuild_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(search_posts('кошк')[0], [])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(search_posts('кошк')[0]), 3)
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.posts[2]]
+        )
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+
+from ..models import Post, User
+from ..thumbnails import THUMBNAIL_GEOMETRIES
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def assertThumbnailsReady(self, image):
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            for geometry, options in THUMBNAIL_GEOMETRIES:
+                get_thumbnail(image, geometry, **options)
+        get_image.assert_not_called()
+
+    def test_warm_thumbnails_builds_missing_thumbnails(self):
+        """После команды шаблону не нужно декодировать исходник."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=self.upload()
+        )
+        call_command('warm_thumbnails', workers=1, stdout=StringIO())
+        self.assertThumbnailsReady(post.image)
+
+    def test_post_create_schedules_thumbnails(self):
+        """Новый пост с картинкой ставит генерацию миниатюр в очередь."""
+        client = Client()
+        client.force_login(self.user)
+        with mock.patch(
+            'posts.thumbnails.transaction.on_commit', lambda func: func()
+        ), mock.patch(
+            'posts.thumbnails._build_thumbnails'
+        ) as make_thumbnails:
+            client.post(reverse('posts:post_create'), {
+                'text': 'Пост с картинкой', 'image': self.upload('new.gif'),
+            })
+            post = Post.objects.get(text='Пост с картинкой')
+            make_thumbnails.assert_called_once_with(post.image.name)
+
+    def test_feed_resolves_page_thumbnails_in_one_query(self):
+        """Миниатюры всей страницы читаются из базы одним запросом."""
+        for number in range(3):
+            Post.objects.create(
+                author=self.user, text=f'Пост {number}',
+                image=self.upload(f'image{number}.gif'),
+            )
+        call_command('warm_thumbnails', workers=1, stdout=StringIO())
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in captured.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(response.content.decode().count('<picture>'), 3)
+
+    def test_feed_does_not_build_missing_thumbnail(self):
+        """Без готовой миниатюры лента показывает исходник, а миниатюра
+        ставится в очередь пула."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=self.upload('late.gif')
+        )
+        with mock.patch(
+            'posts.thumbnails.transaction.on_commit', lambda func: func()
+        ), mock.patch(
+            'posts.thumbnails._build_thumbnails'
+        ) as make_thumbnails, mock.patch.object(
+            default.engine, 'get_image'
+        ) as get_image:
+            response = self.client.get(reverse('posts:index'))
+        get_image.assert_not_called()
+        make_thumbnails.assert_called_once_with(post.image.name)
+        self.assertContains(response, f'src="{post.image.url}"')
@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, PopularAuthor, Post, TimelineEntry
+from ..timeline import (FOLLOW_BACKFILL_LIMIT, MergedTimeline, add_follows,
+                        get_timeline)
+from ..utils import POSTS_NUMBER
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Старый пост'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_backfills_and_unfollow_cleans(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+
+    def test_new_post_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post]
+        )
+
+    def test_popular_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 1):
+            Follow.objects.create(user=self.reader, author=self.author)
+            Follow.objects.create(
+                user=self.other_reader, author=self.author
+            )
+            self.assertTrue(
+                PopularAuthor.objects.filter(author=self.author).exists()
+            )
+            post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                user=self.other_reader, post=post
+            ).exists()
+        )
+        for user in (self.reader, self.other_reader):
+            with self.subTest(user=user):
+                self.client.force_login(user)
+                response = self.client.get(reverse('posts:follow_index'))
+                self.assertEqual(
+                    list(response.context['page_obj']), [post, self.old_post]
+                )
+
+    def test_add_follows_reads_each_batch_once(self):
+        """Пачка подписок заполняет ленты за постоянное число запросов."""
+        other_author = User.objects.create_user(username='other_author')
+        other_post = Post.objects.create(author=other_author, text='Пост')
+        readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(3)
+        ]
+        follows = Follow.objects.bulk_create(
+            [Follow(user=user, author=self.author) for user in readers]
+            + [Follow(user=self.reader, author=other_author)]
+        )
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 2):
+            with self.assertNumQueries(6):
+                add_follows(follows)
+        self.assertTrue(
+            PopularAuthor.objects.filter(author=self.author).exists()
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.reader.pk, other_post.pk)],
+        )
+
+    def test_follow_backfills_recent_posts_then_the_rest(self):
+        """Подписка копирует в ленту только последние посты автора,
+        остальные докладываются после коммита."""
+        posts = [self.old_post] + [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(FOLLOW_BACKFILL_LIMIT)
+        ]
+        with mock.patch('posts.timeline.transaction.on_commit') as on_commit:
+            Follow.objects.create(user=self.reader, author=self.author)
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(
+            set(entries.values_list('post', flat=True)),
+            {post.pk for post in posts[1:]},
+        )
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        self.assertEqual(
+            set(entries.values_list('post', flat=True)),
+            {post.pk for post in posts},
+        )
+
+    def test_merged_timeline_pages_with_cursor(self):
+        """Слитая лента листается курсором без пропусков и повторов."""
+        other_author = User.objects.create_user(username='other_author')
+        Follow.objects.create(user=self.reader, author=other_author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        PopularAuthor.objects.create(author=self.author)
+        posts = [self.old_post]
+        for number in range(2 * POSTS_NUMBER):
+            author = self.author if number % 3 else other_author
+            posts.append(Post.objects.create(
+                author=author, text=f'Пост {number}'
+            ))
+        timeline = get_timeline(self.reader)
+        self.assertIsInstance(timeline, MergedTimeline)
+        shown = []
+        url = reverse('posts:follow_index')
+        while url:
+            response = self.client.get(url)
+            shown.extend(response.context['page_obj'])
+            cursor = response.context['paginator'].next_cursor
+            url = cursor and reverse('posts:follow_index') + (
+                f'?cursor={cursor}'
+            )
+        self.assertEqual(shown, posts[::-1])
@@ -0,0 +1,152 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+
+from ..models import Post
+from ..utils import (CURSOR_NEXT, POSTS_NUMBER, CachedCountPaginator,
+                     _refresh_count, decode_cursor, encode_cursor,
+                     get_page_context, page_cursor)
+
+User = get_user_model()
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(POSTS_NUMBER * 2 + 3):
+            Post.objects.create(author=cls.user, text=f'{i} Тестовый пост')
+        cls.factory = RequestFactory()
+
+    def get_context(self, **params):
+        request = self.factory.get('/', params)
+        return get_page_context(Post.objects.all(), request, cursor=True)
+
+    def test_cursor_roundtrip(self):
+        """Курсор кодирует и раскодирует позицию в ленте."""
+        post = Post.objects.first()
+        cursor = encode_cursor(CURSOR_NEXT, post.pub_date, post.pk)
+        self.assertEqual(
+            decode_cursor(cursor), (CURSOR_NEXT, post.pub_date, post.pk)
+        )
+        for broken in ('', 'мусор', 'bm90LWEtY3Vyc29y'):
+            with self.subTest(broken=broken):
+                self.assertIsNone(decode_cursor(broken))
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсоры вперёд и назад проходят ленту без пропусков."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        seen = []
+        context = self.get_context()
+        self.assertIs(type(context['page_obj']), Page)
+        self.assertFalse(context['page_obj'].has_previous())
+        pages = [list(context['page_obj'])]
+        seen += pages[-1]
+        while context['page_obj'].has_next():
+            context = self.get_context(
+                cursor=context['paginator'].next_cursor
+            )
+            pages.append(list(context['page_obj']))
+            seen += pages[-1]
+        self.assertEqual(seen, expected)
+        for page in reversed(pages[:-1]):
+            context = self.get_context(
+                cursor=context['paginator'].previous_cursor
+            )
+            self.assertEqual(list(context['page_obj']), page)
+        self.assertFalse(context['page_obj'].has_previous())
+
+    def test_count_does_not_break_templates(self):
+        """Шаблон со счётчиками записей рендерится без COUNT(*)."""
+        context = self.get_context()
+        template = Template(
+            '{{ page_obj.start_index }}-{{ page_obj.end_index }} '
+            'из {{ paginator.count }}'
+        )
+        with self.assertNumQueries(0):
+            template.render(Context(context))
+        self.assertIsNone(context['paginator'].count)
+
+    def test_page_number_links_become_cursors(self):
+        """Номер страницы ?page=N переводится в курсор той же страницы."""
+        context = self.get_context()
+        for number in range(2, 4):
+            with self.subTest(page=number):
+                with self.assertNumQueries(1):
+                    cursor = page_cursor(Post.objects.all(), str(number))
+                self.assertEqual(cursor, context['paginator'].next_cursor)
+                context = self.get_context(cursor=cursor)
+        self.assertIsNone(page_cursor(Post.objects.all(), '4'))
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(POSTS_NUMBER * 2 + 3):
+            Post.objects.create(author=cls.user, text=f'{i} Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        """Показываются только крайние и соседние с текущей страницы."""
+        paginator = CachedCountPaginator(range(1000), 10)
+        ellipsis = CachedCountPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, ellipsis, 48, 49, 50, 51, 52, ellipsis, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, ellipsis, 100],
+        )
+        small = CachedCountPaginator(range(30), 10)
+        self.assertEqual(list(small.get_elided_page_range(1)), [1, 2, 3])
+
+    def test_large_count_served_from_cache(self):
+        """Количество большой выборки берётся из кеша без COUNT(*)."""
+        queryset = Post.objects.all()
+        total = queryset.count()
+        with mock.patch('posts.utils.COUNT_EXACT_LIMIT', 5):
+            paginator = CachedCountPaginator(queryset, 10)
+            cache.set(paginator.count_cache_key, (total + 7, 0), 60)
+            with mock.patch('posts.utils._count_executor') as executor:
+                self.assertEqual(paginator.count, total + 7)
+            executor.submit.assert_called_once()
+            last_page = paginator.page(paginator.num_pages)
+        self.assertEqual(len(last_page), total % 10)
+
+    def test_cold_cache_estimates_and_counts_in_background(self):
+        """Без записи в кеше COUNT(*) уходит в фон, а страница получает
+        оценку; второй запрос фон не запускает."""
+        queryset = Post.objects.all()
+        with mock.patch('posts.utils.COUNT_EXACT_LIMIT', 5), mock.patch(
+            'posts.utils._count_executor'
+        ) as executor:
+            paginator = CachedCountPaginator(queryset, 10)
+            with self.assertNumQueries(1):
+                self.assertEqual(paginator.count, 5)
+            CachedCountPaginator(queryset, 10).count
+        executor.submit.assert_called_once_with(
+            _refresh_count, paginator.count_cache_key, mock.ANY
+        )
+
+    def test_count_key_ignores_selected_columns(self):
+        """Лента и values_list API с тем же фильтром делят количество."""
+        feed = CachedCountPaginator(
+            Post.objects.for_feed().filter(author=self.user), 10
+        )
+        api = CachedCountPaginator(
+            Post.objects.filter(author=self.user).values_list('pk', 'text'),
+            10,
+        )
+        other = CachedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(feed.count_cache_key, api.count_cache_key)
+        self.assertNotEqual(feed.count_cache_key, other.count_cache_key)
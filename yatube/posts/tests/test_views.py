@@ -1,16 +1,25 @@
 import shutil
 import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
-from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 
 from ..forms import PostForm
-from ..models import Comment, Follow, Group, Post
-from ..views import POSTS_NUMBER
+from ..management.commands.check_query_plans import Command
+from ..models import Comment, Follow, Group, PopularAuthor, Post
+from ..utils import COMMENTS_NUMBER
+from ..views import POSTS_NUMBER, follow_index
+from .helpers import run_on_commit
 
 User = get_user_model()
 
@@ -194,11 +203,10 @@ class PostViewsTests(TestCase):
         """Тестирование использование кеширования"""
         response = self.authorized_client.get(reverse('posts:index'))
         cache_check = response.content
-        post = Post.objects.get(pk=1)
-        post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, cache_check)
-        cache.clear()
+        Post.objects.get(pk=self.post.pk).delete()
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, cache_check)
 
@@ -338,3 +346,327 @@ class FollowPagesTests(TestCase):
             'posts:follow_index'))
         posts_cnt_new = len(response.context['page_obj'].object_list)
         self.assertEqual(posts_cnt_new, 0)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Имя', last_name='Фамилия'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.popular_reader = User.objects.create_user(username='fan')
+        cls.popular_author = User.objects.create_user(username='star')
+        PopularAuthor.objects.create(author=cls.popular_author)
+        Follow.objects.create(user=cls.popular_reader, author=cls.author)
+        Follow.objects.create(
+            user=cls.popular_reader, author=cls.popular_author
+        )
+        Post.objects.create(author=cls.popular_author, text='Пост звезды')
+        for i in range(POSTS_NUMBER + 3):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'{i} Тестовый пост',
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий'
+            )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_views_stay_within_query_budget(self):
+        """Число запросов не зависит от числа постов и укладывается
+        в объявленный бюджет view."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=text',
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:api_profile', kwargs={'username': self.author.username}
+            ),
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                budget = resolve(url.split('?')[0]).func.query_budget
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), budget)
+
+    def test_follow_page_number_redirects_to_cursor(self):
+        """Старая ссылка ?page=N на ленту подписок переводится в курсор
+        в пределах бюджета, без подсчёта записей."""
+        url = reverse('posts:follow_index')
+        first_page = self.authorized_client.get(url)
+        for page, cursor in (
+            (2, first_page.context['paginator'].next_cursor),
+            (1, None),
+            (100, None),
+            ('abc', None),
+        ):
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(
+                        url, {'page': page}
+                    )
+                self.assertLessEqual(
+                    len(queries), follow_index.query_budget
+                )
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries
+                ))
+                self.assertRedirects(
+                    response, f'{url}?cursor={cursor}' if cursor else url,
+                    fetch_redirect_response=False,
+                )
+        self.client.force_login(self.popular_reader)
+        response = self.client.get(url, {'page': 2})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+    def test_feed_query_plans_use_indexes(self):
+        """Запросы лент не сканируют таблицы и не сортируют во временном
+        B-дереве, и проверка не зависит от содержимого кеша."""
+        runs = []
+        for _ in range(2):
+            with mock.patch.object(
+                Command, 'explain', autospec=True, return_value=[]
+            ) as explain:
+                call_command(
+                    'check_query_plans', username=self.reader.username,
+                    popular_username=self.popular_reader.username,
+                    stdout=StringIO(), stderr=StringIO(),
+                )
+            runs.append([call.args[1] for call in explain.call_args_list])
+        self.assertEqual(runs[0], runs[1])
+        call_command(
+            'check_query_plans', username=self.reader.username,
+            popular_username=self.popular_reader.username,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.author, text='Первый пост')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_anonymous_pages_cached_until_change(self):
+        """Анонимам ленты отдаются из кеша целиком до изменения данных."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.context)
+                response = self.client.get(url)
+                self.assertIsNone(response.context)
+        Post.objects.create(author=self.author, text='Новый пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новый пост')
+
+    def test_page_cached_before_commit_is_invalidated(self):
+        """Страница, закешированная до коммита под новым поколением,
+        сбрасывается после коммита."""
+        url = reverse('posts:index')
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый пост')
+            self.client.get(url)
+            self.assertIsNone(self.client.get(url).context)
+        self.assertIsNotNone(self.client.get(url).context)
+
+    def test_post_list_shared_but_header_personal(self):
+        """Список постов берётся из общего кеша, шапка — своя."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.author_client.get(url)
+        Post.objects.filter(author=self.author).update(text='Без сигналов')
+        content = self.reader_client.get(url).content.decode()
+        self.assertIn('Первый пост', content)
+        self.assertNotIn('Без сигналов', content)
+        self.assertIn('Пользователь: reader', content)
+        self.assertNotIn('Пользователь: author', content)
+
+    def test_comment_and_follow_refresh_pages(self):
+        """Комментарий и подписка сразу видны на закешированных
+        страницах."""
+        post = Post.objects.get()
+        detail = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        self.client.get(detail)
+        self.client.get(profile)
+        Comment.objects.create(post=post, author=self.reader, text='Привет')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.client.get(detail), 'Привет')
+        self.assertContains(self.client.get(profile), 'Подписчиков: 1')
+
+    def test_renamed_or_deleted_group_page_not_served_from_cache(self):
+        """Старый адрес группы не отдаётся из кеша после смены slug
+        и после удаления группы."""
+        group = Group.objects.create(title='Группа', slug='old')
+        url = reverse('posts:group_list', kwargs={'slug': 'old'})
+        self.client.get(url)
+        self.assertIsNone(self.client.get(url).context)
+        group.slug = 'new'
+        group.save()
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+        url = reverse('posts:group_list', kwargs={'slug': 'new'})
+        self.client.get(url)
+        group.delete()
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Первый пост')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        cache.clear()
+
+    def test_repeat_visit_gets_not_modified(self):
+        """Клиент с актуальной копией получает 304 до изменения данных."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.has_header('Last-Modified'))
+                etag = response['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(response.content, b'')
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+        Comment.objects.create(post=self.post, author=self.author, text='Ок')
+        response = self.client.get(urls[-1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cache_headers(self):
+        """Анонимная страница доступна прокси, личная — только браузеру."""
+        url = reverse('posts:index')
+        anonymous = self.client.get(url)
+        personal = self.author_client.get(url)
+        self.assertIn('public', anonymous['Cache-Control'])
+        self.assertIn('s-maxage', anonymous['Cache-Control'])
+        self.assertIn('private', personal['Cache-Control'])
+        self.assertIn('Cookie', anonymous['Vary'])
+        self.assertNotEqual(anonymous['ETag'], personal['ETag'])
+
+    def test_new_csrf_token_invalidates_personal_copy(self):
+        """После нового входа CSRF-токен другой, и страница с формой
+        отдаётся заново, а не 304."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.author_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        etag = self.author_client.get(url)['ETag']
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.author_client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_unknown_urls_do_not_write_generations(self):
+        """ETag и ключи страниц для несуществующих лент не создают
+        записей в кеше."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        names = ('group:missing', 'profile:missing', 'post:0')
+        self.assertEqual(cache.get_many(
+            [f'feed_generation:{name}' for name in names]
+            + [f'feed_modified:{name}' for name in names]
+        ), {})
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.user, text='Вирусный пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+            for i in range(COMMENTS_NUMBER + 5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_inlines_first_page_and_fragment_continues(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        first_page = list(response.context['comments'])
+        self.assertEqual(first_page, self.comments[:-COMMENTS_NUMBER - 1:-1])
+        cursor = response.context['comments_next_cursor']
+        self.assertContains(response, cursor)
+
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            list(response.context['comments']), self.comments[4::-1]
+        )
+        self.assertIsNone(response.context['comments_next_cursor'])
+        self.assertNotContains(response, 'data-comments-more')
+        self.assertNotContains(response, '<html')
@@ -0,0 +1,223 @@
+"""Генерация миниатюр картинок постов вне запроса читателя.
+
+sorl-thumbnail создаёт миниатюру при первом рендере тега {% thumbnail %},
+и этот запрос ждёт декодирования исходника. Поэтому миниатюры всех
+размеров из шаблонов строятся заранее: после сохранения поста — в
+фоновых потоках, для уже существующих постов — командой
+warm_thumbnails. Очередь пула ограничена MAX_PENDING_THUMBNAILS
+картинками: то, что не влезло, построит команда, а запрос не ждёт
+пула ни до, ни после ответа. С настройкой THUMBNAILS_IN_BACKGROUND =
+False (так в тестах) миниатюры строятся сразу, в том же потоке.
+
+Запрос никогда не строит миниатюру сам. Ленты находят миниатюры всей
+страницы одним запросом к кешу и одним к базе (resolve_thumbnails) и
+кладут их в post.thumbnail; если миниатюры ещё нет, показывается
+fallback_image, а миниатюра ставится в очередь.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from core.timing import measure
+
+from .images import feed_variant
+
+logger = logging.getLogger(__name__)
+
+# Размеры, которые строятся заранее. Первый — миниатюра ленты: её
+# ищут resolve_thumbnails и Post.thumbnail для post_image.html.
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+FEED_THUMBNAIL = THUMBNAIL_GEOMETRIES[0]
+THUMBNAIL_WORKERS: int = 2
+MAX_PENDING_THUMBNAILS: int = 100
+
+_thumbnail_executor = ThreadPoolExecutor(
+    max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def image_file(name):
+    """Исходник для sorl в хранилище поля Post.image.
+
+    Ключи sorl зависят от хранилища, поэтому имя без него дало бы
+    другие миниатюры, чем {% thumbnail post.image %}.
+    """
+    storage = apps.get_model('posts', 'Post')._meta.get_field('image').storage
+    return ImageFile(name, storage)
+
+
+def make_thumbnails(name, force=False):
+    """Строит миниатюры всех размеров для картинки name из хранилища.
+
+    С force старые миниатюры удаляются и строятся заново.
+    """
+    source = image_file(name)
+    if force:
+        delete(source, delete_file=False)
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        get_thumbnail(source, geometry, **options)
+
+
+def delete_image(name):
+    """Удаляет картинку вместе с её миниатюрами."""
+    delete(image_file(name))
+
+
+def _build_thumbnails(name):
+    try:
+        make_thumbnails(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+
+
+def schedule_thumbnails(post):
+    """Ставит генерацию миниатюр поста в очередь после коммита."""
+    if post.image:
+        _schedule(post.image.name)
+
+
+def _schedule(name):
+    transaction.on_commit(lambda: _submit(name))
+
+
+def _submit(name):
+    if not getattr(settings, 'THUMBNAILS_IN_BACKGROUND', True):
+        _build_thumbnails(name)
+        return
+    with _pending_lock:
+        if name in _pending:
+            return
+        if len(_pending) >= MAX_PENDING_THUMBNAILS:
+            logger.warning('Очередь миниатюр заполнена, пропущена %s', name)
+            return
+        _pending.add(name)
+    _thumbnail_executor.submit(_run, name)
+
+
+def _run(name):
+    try:
+        _build_thumbnails(name)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+        connection.close()
+
+
+def fallback_image(image, image_variants=''):
+    """Что показать, пока миниатюра строится: вариант srcset шириной с
+    миниатюру (он уже в пропорциях ленты) или исходник."""
+    name = feed_variant(image_variants)
+    return ImageFile(name, default_storage) if name else image
+
+
+def feed_thumbnail(image, image_variants=''):
+    """Готовая миниатюра ленты для одной картинки.
+
+    Если её ещё нет, она ставится в очередь, а возвращается
+    fallback_image.
+    """
+    if not image:
+        return None
+    geometry, options = FEED_THUMBNAIL
+    try:
+        with measure('thumbnails'):
+            key = add_prefix(
+                _thumbnail_file(ImageFile(image), geometry, options).key
+            )
+            stored = _get_stored([key])
+    except Exception:
+        logger.exception('Не удалось найти миниатюру для %s', image)
+        return fallback_image(image, image_variants)
+    if key in stored:
+        return deserialize_image_file(stored[key])
+    _schedule(image.name)
+    return fallback_image(image, image_variants)
+
+
+def _thumbnail_file(source, geometry, options):
+    """Файл миниатюры, который выбрал бы sorl для этих аргументов.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail, чтобы
+    имя и ключ совпали с созданными тегом {% thumbnail %}.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def _get_stored(keys):
+    """Сырые значения хранилища ключей sorl для списка ключей."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        # Как и sorl, запоминаем отсутствие ключа, чтобы не ходить в базу.
+        kvstore.cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        values.update(found)
+    return {
+        key: value for key, value in values.items()
+        if value is not None and value != EMPTY_VALUE
+    }
+
+
+def resolve_thumbnails(posts):
+    """Заполняет post.thumbnail у всех постов страницы разом.
+
+    Вместо миниатюр, которых ещё нет, ставится fallback_image, а сами
+    миниатюры уходят в очередь.
+    """
+    geometry, options = FEED_THUMBNAIL
+    pending = {}
+    for post in posts:
+        if post.image and 'thumbnail' not in post.__dict__:
+            thumbnail = _thumbnail_file(
+                ImageFile(post.image), geometry, options
+            )
+            pending.setdefault(add_prefix(thumbnail.key), []).append(post)
+    if not pending:
+        return
+    with measure('thumbnails'):
+        stored = _get_stored(list(pending))
+    for key, waiting in pending.items():
+        if key in stored:
+            thumbnail = deserialize_image_file(stored[key])
+            for post in waiting:
+                post.thumbnail = thumbnail
+            continue
+        _schedule(waiting[0].image.name)
+        for post in waiting:
+            post.thumbnail = fallback_image(post.image, post.image_variants)
@@ -0,0 +1,267 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в TimelineEntry всех подписчиков автора,
+и лента /follow/ читается одним диапазоном по индексу (user, pub_date).
+Посты популярных авторов (PopularAuthor) не раскладываются: их
+подмешивают в ленту при чтении.
+
+Подписка в запросе копирует в ленту только FOLLOW_BACKFILL_LIMIT
+последних постов автора, остальные докладываются после коммита в
+фоновом потоке. С настройкой TIMELINE_BACKFILL_IN_BACKGROUND = False
+(так в тестах) — сразу, в том же потоке.
+"""
+import heapq
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from .models import Follow, PopularAuthor, Post, TimelineEntry, User
+from .utils import CURSOR_PREVIOUS, POSTS_NUMBER, keyset_queryset
+
+FANOUT_FOLLOWERS_LIMIT: int = 1000
+FANOUT_BATCH_SIZE: int = 500
+FOLLOW_BACKFILL_LIMIT: int = POSTS_NUMBER * 3
+
+logger = logging.getLogger(__name__)
+
+_backfill_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='timeline-backfill'
+)
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def is_popular(author_id):
+    return PopularAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out_post(post):
+    """Кладёт пост в ленты всех подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_posts(posts):
+    """fan_out_post для пачки постов: подписчики всех авторов пачки
+    читаются одним запросом."""
+    author_ids = {post.author_id for post in posts}
+    author_ids -= set(PopularAuthor.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+    followers = defaultdict(list)
+    for author_id, user_id in Follow.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', 'user_id').iterator():
+        followers[author_id].append(user_id)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for post in posts
+        for user_id in followers[post.author_id]
+    )
+
+
+def add_follow(follow):
+    """Заполняет ленту нового подписчика уже вышедшими постами автора.
+
+    Автор, у которого подписчиков стало больше FANOUT_FOLLOWERS_LIMIT,
+    становится популярным и больше не раскладывается по лентам.
+    """
+    add_follows([follow])
+
+
+def add_follows(follows, limit=FOLLOW_BACKFILL_LIMIT):
+    """add_follow для пачки подписок: популярность авторов, число их
+    подписчиков и их посты читаются одним запросом на пачку.
+
+    Из постов автора копируются только limit последних; остальные
+    докладывает backfill_follows после коммита. С limit=None посты
+    копируются сразу все.
+    """
+    author_ids = {follow.author_id for follow in follows}
+    author_ids -= set(PopularAuthor.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+    popular = set(Follow.objects.filter(
+        author_id__in=author_ids
+    ).values('author_id').annotate(
+        followers=Count('pk')
+    ).filter(
+        followers__gt=FANOUT_FOLLOWERS_LIMIT
+    ).values_list('author_id', flat=True))
+    PopularAuthor.objects.bulk_create(
+        [PopularAuthor(author_id=author_id) for author_id in popular],
+        ignore_conflicts=True,
+    )
+    author_ids -= popular
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author_id__in=author_ids)
+    cutoffs = {} if limit is None else _backfill_cutoffs(author_ids, limit)
+    if cutoffs:
+        posts = posts.exclude(_older_than(cutoffs))
+    _insert_posts(follows, posts)
+    truncated = [
+        follow.pk for follow in follows if follow.author_id in cutoffs
+    ]
+    if truncated:
+        transaction.on_commit(lambda: _submit_backfill(truncated))
+
+
+def _backfill_cutoffs(author_ids, limit):
+    """Дата limit+1-го с конца поста каждого автора, у которого постов
+    больше limit. Каждый подзапрос — один шаг по post_author_date_idx."""
+    cutoff = Post.objects.filter(
+        author_id=OuterRef('pk')
+    ).order_by('-pub_date', '-pk').values('pub_date')[limit:limit + 1]
+    return {
+        author_id: pub_date
+        for author_id, pub_date in User.objects.filter(
+            pk__in=author_ids
+        ).annotate(cutoff=Subquery(cutoff)).values_list('pk', 'cutoff')
+        if pub_date is not None
+    }
+
+
+def _older_than(cutoffs):
+    condition = Q()
+    for author_id, pub_date in cutoffs.items():
+        condition |= Q(author_id=author_id, pub_date__lte=pub_date)
+    return condition
+
+
+def _insert_posts(follows, posts):
+    by_author = defaultdict(list)
+    for author_id, pk, pub_date in posts.values_list(
+        'author_id', 'pk', 'pub_date'
+    ).iterator():
+        by_author[author_id].append((pk, pub_date))
+    _bulk_insert(
+        TimelineEntry(user_id=follow.user_id, post_id=pk, pub_date=pub_date)
+        for follow in follows
+        for pk, pub_date in by_author[follow.author_id]
+    )
+
+
+def backfill_follows(follow_ids):
+    """Докладывает в ленты все посты авторов подписок follow_ids.
+
+    Подписки, которые успели удалить, и ставшие популярными авторы
+    пропускаются; уже разложенные посты не дублируются.
+    """
+    follows = list(Follow.objects.filter(
+        pk__in=follow_ids, author__popular__isnull=True
+    ))
+    _insert_posts(follows, Post.objects.filter(
+        author_id__in={follow.author_id for follow in follows}
+    ))
+
+
+def _submit_backfill(follow_ids):
+    if not getattr(settings, 'TIMELINE_BACKFILL_IN_BACKGROUND', True):
+        _backfill(follow_ids)
+        return
+    _backfill_executor.submit(_run_backfill, follow_ids)
+
+
+def _backfill(follow_ids):
+    try:
+        backfill_follows(follow_ids)
+    except Exception:
+        logger.exception('Не удалось дополнить ленты подписок %s', follow_ids)
+
+
+def _run_backfill(follow_ids):
+    try:
+        _backfill(follow_ids)
+    finally:
+        connection.close()
+
+
+def remove_follow(follow):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+def _entry_posts(user):
+    """Посты из материализованной ленты с ключами сортировки из
+    TimelineEntry: чтение идёт по индексу timeline_user_date_idx."""
+    return Post.objects.for_feed().filter(
+        timeline_entries__user=user
+    ).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_pk=F('timeline_entries__post'),
+    )
+
+
+class MergedTimeline:
+    """Лента читателя популярных авторов для CursorPaginator.
+
+    Каждая страница читает не больше limit записей из ленты читателя и
+    столько же постов каждого популярного автора по индексу
+    post_author_date_idx, а затем сливает их по (pub_date, pk). Посты,
+    разложенные в ленту до того, как автор стал популярным, не
+    повторяются.
+    """
+
+    def __init__(self, user, author_ids):
+        self.user = user
+        self.author_ids = author_ids
+
+    def keyset_page(self, position, limit):
+        sources = [list(keyset_queryset(
+            _entry_posts(self.user), ('feed_date', 'feed_pk'), position
+        )[:limit])]
+        for author_id in self.author_ids:
+            posts = list(keyset_queryset(
+                Post.objects.for_feed().filter(author_id=author_id),
+                ('pub_date', 'pk'), position,
+            )[:limit])
+            for post in posts:
+                post.feed_date, post.feed_pk = post.pub_date, post.pk
+            sources.append(posts)
+        backwards = position is not None and position[0] == CURSOR_PREVIOUS
+        merged = []
+        seen = set()
+        for post in heapq.merge(
+            *sources, key=attrgetter('feed_date', 'feed_pk'),
+            reverse=not backwards,
+        ):
+            if post.pk in seen:
+                continue
+            seen.add(post.pk)
+            merged.append(post)
+            if len(merged) == limit:
+                break
+        return merged
+
+
+def get_timeline(user):
+    """Лента подписок, упорядоченная по (feed_date, feed_pk).
+
+    Без популярных авторов это queryset по индексу ленты, иначе
+    MergedTimeline, которая листается только курсорами.
+    """
+    merged_authors = list(Follow.objects.filter(
+        user=user, author__popular__isnull=False
+    ).values_list('author_id', flat=True))
+    if merged_authors:
+        return MergedTimeline(user, merged_authors)
+    return _entry_posts(user).order_by('-feed_date', '-feed_pk')
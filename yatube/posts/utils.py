@@ -1,14 +1,324 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.http import HttpResponseRedirect
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 POSTS_NUMBER: int = 10
+COMMENTS_NUMBER: int = 20
+PAGES_ON_EACH_SIDE: int = 2
+PAGES_ON_ENDS: int = 1
+COUNT_EXACT_LIMIT: int = 1000
+COUNT_FRESH_SECONDS: int = 60
+COUNT_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+_count_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='count-refresh'
+)
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    """Упаковывает позицию в ленте в непрозрачную строку для URL."""
+    raw = f'{direction}|{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор, для битого курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or value is None:
+        return None
+    return direction, value, pk
+
+
+def _refresh_count(key, queryset):
+    try:
+        cache.set(
+            key, (queryset.count(), time.time()), COUNT_CACHE_TIMEOUT
+        )
+    finally:
+        cache.delete(f'{key}:lock')
+        connection.close()
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор с дешёвым подсчётом записей и окном номеров страниц.
+
+    Небольшие выборки считаются точно запросом с LIMIT. Для больших
+    количество берётся из кеша, а устаревшее или отсутствующее значение
+    обновляется в фоновом потоке, так что COUNT(*) по всей таблице не
+    блокирует ответ. Пока кеш пуст, количество оценивается как
+    COUNT_EXACT_LIMIT.
+    """
+    ELLIPSIS = '…'
+
+    @property
+    def count_cache_key(self):
+        # Ключ по таблице и условию WHERE: выборки с разными столбцами
+        # (страница ленты и values_list API) делят одно количество.
+        query = self.object_list.query
+        where, params = query.get_compiler(
+            self.object_list.db
+        ).compile(query.where)
+        condition = f'{query.model._meta.db_table}|{where}|{params!r}'
+        return 'page_count:' + hashlib.md5(condition.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        queryset = self.object_list.order_by()
+        bounded = queryset[:COUNT_EXACT_LIMIT].count()
+        if bounded < COUNT_EXACT_LIMIT:
+            return bounded
+        key = self.count_cache_key
+        count, computed_at = cache.get(key, (COUNT_EXACT_LIMIT, 0))
+        if (
+            time.time() - computed_at > COUNT_FRESH_SECONDS
+            and cache.add(f'{key}:lock', 1, COUNT_FRESH_SECONDS)
+        ):
+            _count_executor.submit(_refresh_count, key, queryset)
+        return max(count, COUNT_EXACT_LIMIT)
+
+    def page(self, number):
+        """Срез не обрезается по count: он может быть приблизительным.
+
+        Срез остаётся ленивым, поэтому при попадании в кеш фрагмента
+        ленты запрос за постами страницы не выполняется.
+        """
+        if self.orphans:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def get_elided_page_range(self, number=1, on_each_side=PAGES_ON_EACH_SIDE,
+                              on_ends=PAGES_ON_ENDS):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+        number = self.validate_number(number)
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
+
+
+def keyset_queryset(queryset, ordering, position):
+    """queryset после позиции курсора по ключу ordering = (поле, id).
+
+    Без позиции и для CURSOR_NEXT записи идут от новых к старым, для
+    CURSOR_PREVIOUS — от старых к новым, начиная сразу за курсором.
+    """
+    field, tiebreak = ordering
+    if position is None or position[0] == CURSOR_NEXT:
+        if position is not None:
+            _, value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value})
+                | Q(**{field: value, f'{tiebreak}__lt': pk})
+            )
+        return queryset.order_by(f'-{field}', f'-{tiebreak}')
+    _, value, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__gt': value})
+        | Q(**{field: value, f'{tiebreak}__gt': pk})
+    ).order_by(field, tiebreak)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id): без COUNT(*) и OFFSET.
 
+    Страница выбирается условием по ключу последней показанной записи,
+    поэтому время ответа не зависит от глубины листания. Номер страницы
+    относительный: 1 для начала ленты, 2 если есть предыдущая страница,
+    этого достаточно для has_next/has_previous у обычного Page.
+    """
+    cursor_mode = True
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, POSTS_NUMBER)
+    def __init__(self, object_list, per_page, ordering=('pub_date', 'pk')):
+        super().__init__(object_list, per_page)
+        self.ordering = ordering
+        self.number = 1
+        self.cursor = None
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._has_next = False
+
+    @property
+    def count(self):
+        # Записи не считаются; None вместо исключения, чтобы шаблон с
+        # paginator.count или page_obj.end_index не падал.
+        return None
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self._has_next else self.number
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    def validate_number(self, number):
+        return number
+
+    def fetch(self, position, limit):
+        """До limit записей после позиции position в порядке обхода.
+
+        Вместо queryset можно передать ленту с методом
+        keyset_page(position, limit), который делает то же самое.
+        """
+        if isinstance(self.object_list, QuerySet):
+            return list(keyset_queryset(
+                self.object_list, self.ordering, position
+            )[:limit])
+        return self.object_list.keyset_page(position, limit)
+
+    def get_page(self, cursor):
+        field, tiebreak = self.ordering
+        position = decode_cursor(cursor)
+        self.cursor = cursor if position is not None else None
+        backwards = position is not None and position[0] == CURSOR_PREVIOUS
+        items = self.fetch(position, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_previous, self._has_next = has_more, True
+        else:
+            has_previous, self._has_next = position is not None, has_more
+        if items and has_previous:
+            first = items[0]
+            self.previous_cursor = encode_cursor(
+                CURSOR_PREVIOUS, getattr(first, field),
+                getattr(first, tiebreak)
+            )
+        if items and self._has_next:
+            last = items[-1]
+            self.next_cursor = encode_cursor(
+                CURSOR_NEXT, getattr(last, field), getattr(last, tiebreak)
+            )
+        self.number = 2 if self.previous_cursor else 1
+        self._has_next = self.next_cursor is not None
+        return Page(items, self.number, self)
+
+
+def page_cursor(queryset, page, ordering=('pub_date', 'pk')):
+    """Курсор страницы page из старой нумерации ?page=N.
+
+    Ключ последней записи предыдущей страницы ищется одним запросом с
+    OFFSET. Для первой страницы, неверного номера, страницы за концом
+    ленты и лент, не являющихся queryset, возвращается None — начало
+    ленты.
+    """
+    try:
+        number = int(page)
+    except (TypeError, ValueError):
+        return None
+    if number <= 1 or not isinstance(queryset, QuerySet):
+        return None
+    field, tiebreak = ordering
+    offset = (number - 1) * POSTS_NUMBER - 1
+    keys = list(queryset.order_by(
+        f'-{field}', f'-{tiebreak}'
+    ).values_list(field, tiebreak)[offset:offset + 1])
+    if not keys:
+        return None
+    return encode_cursor(CURSOR_NEXT, *keys[0])
+
+
+def page_redirect(queryset, request, ordering=('pub_date', 'pk')):
+    """Редирект старой ссылки ?page=N курсорной ленты на курсорную
+    страницу или None, если номера страницы в запросе нет.
+
+    Курсорные ленты не считают записи, поэтому номер страницы не
+    обслуживается через CachedCountPaginator, а переводится в курсор.
+    """
+    if 'page' not in request.GET:
+        return None
+    query = request.GET.copy()
+    cursor = page_cursor(queryset, query.pop('page')[-1], ordering)
+    query.pop('cursor', None)
+    if cursor:
+        query['cursor'] = cursor
+    url = request.path
+    if query:
+        url += '?' + query.urlencode()
+    return HttpResponseRedirect(url)
+
+
+def get_page_context(queryset, request, cursor=False,
+                     ordering=('pub_date', 'pk')):
+    """Контекст страницы ленты.
+
+    С cursor=True лента листается курсорами (?cursor=...); старые ссылки
+    вида ?page=N view переводит в курсор через page_redirect.
+    """
+    if cursor:
+        paginator = CursorPaginator(queryset, POSTS_NUMBER, ordering)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+        return {
+            'paginator': paginator,
+            'page_number': page_obj.number,
+            'page_obj': page_obj,
+        }
+    paginator = CachedCountPaginator(queryset, POSTS_NUMBER)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        'page_range': list(
+            paginator.get_elided_page_range(page_obj.number)
+        ),
+    }
+
+
+def get_comments_context(comments, cursor=None):
+    """Страница комментариев: новые сверху, листается курсором.
+
+    Первая страница встраивается в страницу поста, следующие отдаёт
+    post_comments фрагментами по курсору next_cursor.
+    """
+    paginator = CursorPaginator(
+        comments.select_related('author').defer('author__password'),
+        COMMENTS_NUMBER,
+        ordering=('created', 'pk'),
+    )
+    return {
+        'comments': paginator.get_page(cursor),
+        'comments_next_cursor': paginator.next_cursor,
     }
@@ -1,11 +1,25 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
+from core.decorators import (anonymous_cache_page, conditional_page,
+                             query_budget)
+
+from .caching import (FEED_CACHE_TIMEOUT, FEED_PROXY_MAX_AGE,
+                      feed_cache_context, group_generations, group_modified,
+                      index_generations, index_modified, post_generations,
+                      post_modified, profile_generations, profile_modified)
+from . import export, follows
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_page_context
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .search import search_posts
+from .thumbnails import schedule_thumbnails
+from .timeline import get_timeline
+from .utils import get_comments_context, get_page_context, page_redirect
 
 User = get_user_model()
 
@@ -13,52 +27,94 @@ User = get_user_model()
 POSTS_NUMBER: int = 10
 
 
-@cache_page(20)
+@conditional_page(index_generations, index_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, index_generations)
+@query_budget(4)
 def index(request):
-    context = get_page_context(Post.objects.all(), request)
+    context = get_page_context(Post.objects.for_feed(), request)
+    context.update(feed_cache_context(context, 'index'))
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_generations, group_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, group_generations)
+@query_budget(5)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
         'group': group,
     }
-    context.update(get_page_context(group.posts.all(), request))
+    context.update(get_page_context(group.posts.for_feed(), request))
+    context.update(feed_cache_context(context, f'group:{slug}'))
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_generations, profile_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, profile_generations)
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = request.user.is_authenticated and author.following.filter(
-        user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    following = follows.is_following(request.user, author.pk)
     title = 'Профайл пользователя ' + username
     context = {
         'title': title,
         'author': author,
+        'stats': UserStats.of(author),
         'following': following,
     }
-    context.update(get_page_context(author.posts.all(), request))
+    context.update(get_page_context(author.posts.for_feed(), request))
+    context.update(feed_cache_context(context, f'profile:{username}'))
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_generations, post_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, post_generations)
+@query_budget(4)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author = post.author
-    post_count_user = Post.objects.filter(author=author).count()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'), pk=post_id
+    )
+    post_count_user = UserStats.of(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
     title = f'Пост {post_id}'
     context = {
         'title': title,
         'post': post,
         'post_count_user': post_count_user,
-        'comments': comments,
         'form': form,
     }
+    context.update(get_comments_context(post.comments.all()))
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_page(post_generations, post_modified, FEED_PROXY_MAX_AGE)
+@anonymous_cache_page(FEED_CACHE_TIMEOUT, post_generations)
+@query_budget(3)
+def post_comments(request, post_id):
+    """Следующая страница комментариев HTML-фрагментом."""
+    context = {'post_id': post_id}
+    context.update(get_comments_context(
+        Comment.objects.filter(post_id=post_id), request.GET.get('cursor')
+    ))
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(4)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
+    posts, next_cursor = search_posts(query, cursor)
+    context = {
+        'query': query,
+        'posts': posts,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/post_create.html'
@@ -70,6 +126,7 @@ def post_create(request):
         form = form.save(commit=False)
         form.author = request.user
         form.save()
+        schedule_thumbnails(form)
         return redirect('posts:profile', username=request.user.username)
     return render(request, template, {'form': form})
 
@@ -87,6 +144,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -109,9 +168,17 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(4)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    context = get_page_context(posts, request)
+    posts = get_timeline(request.user)
+    ordering = ('feed_date', 'feed_pk')
+    response = page_redirect(posts, request, ordering)
+    if response is not None:
+        return response
+    context = get_page_context(posts, request, cursor=True, ordering=ordering)
+    context.update(
+        feed_cache_context(context, f'follow:{request.user.pk}', 'index')
+    )
     return render(request, 'posts/follow.html', context)
 
 
@@ -128,3 +195,60 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+def following_state(request, usernames):
+    """Ответ пакетных подписок: на кого из usernames подписан
+    пользователь."""
+    authors = User.objects.filter(
+        username__in=usernames[:follows.MAX_BATCH_FOLLOWS]
+    ).values_list('pk', 'username')
+    followed = follows.followee_ids(request.user.pk)
+    return JsonResponse({
+        'following': sorted(
+            username for pk, username in authors if pk in followed
+        ),
+    })
+
+
+@login_required
+@require_POST
+def follow_many(request):
+    usernames = request.POST.getlist('username')
+    follows.follow_many(request.user, usernames)
+    return following_state(request, usernames)
+
+
+@login_required
+@require_POST
+def unfollow_many(request):
+    usernames = request.POST.getlist('username')
+    follows.unfollow_many(request.user, usernames)
+    return following_state(request, usernames)
+
+
+@staff_member_required
+def export_data(request, kind):
+    """Выгрузка для персонала: ?format=ndjson|csv, для постов — фильтры
+    author, group, since, until."""
+    export_format = request.GET.get('format', 'ndjson')
+    if kind not in export.EXPORTS or export_format not in export.FORMATS:
+        raise Http404
+    filters = None
+    if kind == 'posts':
+        try:
+            filters = export.post_filters(
+                request.GET.get('author'), request.GET.get('group'),
+                request.GET.get('since'), request.GET.get('until'),
+            )
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+    _, content_type = export.FORMATS[export_format]
+    response = StreamingHttpResponse(
+        export.export_lines(kind, export_format, filters),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{export_format}"'
+    )
+    return response
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -52,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +69,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Доля запросов, которые замеряет core.timing. Заголовок Server-Timing
+# получают только сотрудники (и все при DEBUG), остальным — только лог.
+SERVER_TIMING_SAMPLE_RATE = 0.01
+
+# core.slow_queries записывает запросы дольше порога, миллисекунды, и
+# запросы, выполненные за один HTTP-запрос не меньше REPEAT раз.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_REPEAT_THRESHOLD = 10
+# Доля HTTP-запросов, в которых запросы к базе замеряются.
+SLOW_QUERY_SAMPLE_RATE = 0.1
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
@@ -88,10 +105,17 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.db — sqlite3 с WAL и прагмами из core.db.base.DEFAULT_PRAGMAS;
+# OPTIONS['pragmas'] их переопределяет, None отключает прагму.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -150,6 +174,34 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+
+# Тесты (manage.py test и pytest) получают свой кеш на время прогона:
+# cache.clear() в тестах не трогает кеш dev-сервера, а записи sorl и
+# поколения лент не переходят из прогона в прогон.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    _test_cache_dir = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    atexit.register(shutil.rmtree, _test_cache_dir, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        _test_cache_dir, 'cache.sqlite3'
+    )
+
+# Миниатюры строятся в пуле потоков posts.thumbnails. В тестах — в том же
+# потоке: иначе пул пишет в базу и MEDIA_ROOT уже после конца теста.
+THUMBNAILS_IN_BACKGROUND = not TESTING
+
+# Старые посты автора докладываются в ленту нового подписчика в фоновом
+# потоке posts.timeline, в тестах — в том же потоке.
+TIMELINE_BACKFILL_IN_BACKGROUND = not TESTING
+
+# В тестах запросы к базе не замеряются: выборка случайна, и запись в
+# QueryStat меняла бы число запросов от прогона к прогону. Тесты
+# core.slow_queries включают замер через override_settings.
+SLOW_QUERY_SAMPLE_RATE = 0 if TESTING else SLOW_QUERY_SAMPLE_RATE